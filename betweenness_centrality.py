@@ -2,9 +2,12 @@
 !pip install pycairo
 import cairo
 !pip install python-igraph
-import collections, random, igraph, pprint
+import collections, itertools, random, igraph, pprint
+import concurrent.futures, hashlib, heapq, os, timeit
+import numpy as np
+from multiprocessing import shared_memory
 
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Set, Tuple
 
 random.seed(1337)
 
@@ -161,4 +164,774 @@ def all_vertices_betweenness_centrality(g: List[List[int]]) -> List[float]:
 
 all_vertices_betweenness_centrality(g_adjlist )
 
-g.betweenness(directed=False)
\ No newline at end of file
+g.betweenness(directed=False)
+
+# The functions above allocate fresh `dists`, `weights` and `paths` lists for
+# every source, and copy a list every time a predecessor is found. The kernel
+# below works on a CSR form of the graph (the neighbors of `v` are
+# `neighbors[offsets[v]:offsets[v+1]]`) and reuses one set of preallocated
+# numpy buffers across all sources. The BFS runs one level at a time:
+# - `stack` receives the vertices in order of distance (level by level)
+# - every shortest-path DAG edge (predecessor `u`, successor `v`) is written to
+#   the flat `pred_u`/`pred_v` arrays, along with the CSR slot it came from
+#   (`pred_slot`); `level_offsets` is a CSR-style offset
+#   into those arrays, so that `pred_u[level_offsets[d]:level_offsets[d+1]]`
+#   are the predecessors of the vertices at distance d+1
+# - path counts (`sigma`) and dependencies (`delta`) are float64
+# Only the entries touched by a source are reset afterwards.
+
+def adjlist_to_csr(g: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(g) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(neighbors) for neighbors in g])
+    neighbors = np.fromiter(itertools.chain.from_iterable(g), dtype=np.int64,
+                            count=offsets[-1])
+    return (offsets, neighbors)
+
+BrandesBuffers = collections.namedtuple("BrandesBuffers",
+                                        ["dists", "wdists", "sigma", "delta", "stack",
+                                         "pred_u", "pred_v", "pred_slot", "level_offsets"])
+
+def make_brandes_buffers(N: int, nslots: int) -> BrandesBuffers:
+    # a DAG edge uses up one CSR slot, so `nslots` (the length of `neighbors`)
+    # bounds the number of predecessor entries
+    return BrandesBuffers(dists=np.full(N, -1, dtype=np.int64),
+                          wdists=np.full(N, np.inf),
+                          sigma=np.zeros(N),
+                          delta=np.zeros(N),
+                          stack=np.zeros(N, dtype=np.int64),
+                          pred_u=np.zeros(nslots, dtype=np.int64),
+                          pred_v=np.zeros(nslots, dtype=np.int64),
+                          pred_slot=np.zeros(nslots, dtype=np.int64),
+                          level_offsets=np.zeros(N + 1, dtype=np.int64))
+
+def single_source_shortest_path_dag(s: int, offsets: np.ndarray, neighbors: np.ndarray,
+                                    buf: BrandesBuffers) -> Tuple[int, int]:
+    # fills `buf` for source `s` and returns (number of vertices reached,
+    # number of levels of predecessor entries)
+    dists, sigma, stack = buf.dists, buf.sigma, buf.stack
+    dists[s] = 0
+    sigma[s] = 1.0
+    stack[0] = s
+    lo, hi = 0, 1   # the current frontier is stack[lo:hi]
+    npreds = 0
+    nlevels = 0
+    buf.level_offsets[0] = 0
+    while lo < hi:
+        frontier = stack[lo:hi]
+        d = dists[frontier[0]]
+        starts = offsets[frontier]
+        counts = offsets[frontier + 1] - starts
+        total = counts.sum()
+        if total == 0:
+            break
+        # all the CSR slots of edges leaving the frontier, and their endpoints
+        slots = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        u = np.repeat(frontier, counts)
+        v = neighbors[slots]
+        new_vertices = np.unique(v[dists[v] < 0])
+        dists[new_vertices] = d + 1
+        on_dag = dists[v] == d + 1
+        u = u[on_dag]
+        v = v[on_dag]
+        buf.pred_u[npreds:npreds + len(u)] = u
+        buf.pred_v[npreds:npreds + len(v)] = v
+        buf.pred_slot[npreds:npreds + len(u)] = slots[on_dag]
+        np.add.at(sigma, v, sigma[u])
+        npreds += len(u)
+        nlevels += 1
+        buf.level_offsets[nlevels] = npreds
+        stack[hi:hi + len(new_vertices)] = new_vertices
+        lo, hi = hi, hi + len(new_vertices)
+    return (hi, nlevels)
+
+# With positive edge weights (`weights` is parallel to `neighbors`), the DAG
+# comes from a binary-heap Dijkstra search with path counting instead, writing
+# to the same buffers: `wdists` holds the weighted distances, and the vertices
+# are grouped by equal distance, each group playing the part of a BFS level
+# (`dists` holds the group index). A predecessor is always strictly closer than
+# its successor, so `accumulate_dependencies` works unchanged. Distances are
+# compared exactly, so ties are only detected when the sums of the weights are
+# exactly equal (e.g. integer weights).
+
+def single_source_dijkstra_dag(s: int, offsets: np.ndarray, neighbors: np.ndarray,
+                               weights: np.ndarray, buf: BrandesBuffers) -> Tuple[int, int]:
+    dists, wdists, sigma, stack = buf.dists, buf.wdists, buf.sigma, buf.stack
+    wdists[s] = 0.0
+    sigma[s] = 1.0
+    # (predecessor, CSR slot) pairs of the vertices that are not yet settled
+    preds = {s: []}
+    heap = [(0.0, s)]
+    nvisited = 0
+    npreds = 0
+    group = -1
+    group_dist = -1.0
+    while len(heap) > 0:
+        (d, u) = heapq.heappop(heap)
+        if dists[u] >= 0:   # a stale heap entry for a settled vertex
+            continue
+        if d != group_dist:
+            group += 1
+            group_dist = d
+            if group > 0:
+                # the predecessors of this group start here
+                buf.level_offsets[group - 1] = npreds
+        dists[u] = group
+        stack[nvisited] = u
+        nvisited += 1
+        for (p, slot) in preds.pop(u):
+            buf.pred_u[npreds] = p
+            buf.pred_v[npreds] = u
+            buf.pred_slot[npreds] = slot
+            npreds += 1
+        lo = offsets[u]
+        hi = offsets[u + 1]
+        for (slot, v, w) in zip(range(lo, hi), neighbors[lo:hi].tolist(), weights[lo:hi].tolist()):
+            if dists[v] >= 0:
+                continue
+            new_dist = d + w
+            if new_dist < wdists[v]:
+                wdists[v] = new_dist
+                sigma[v] = sigma[u]
+                preds[v] = [(u, slot)]
+                heapq.heappush(heap, (new_dist, v))
+            elif new_dist == wdists[v]:
+                sigma[v] += sigma[u]
+                preds[v].append((u, slot))
+    nlevels = max(group, 0)
+    buf.level_offsets[nlevels] = npreds
+    return (nvisited, nlevels)
+
+def accumulate_dependencies(buf: BrandesBuffers, nlevels: int,
+                            edge_ids: Optional[np.ndarray] = None,
+                            edge_scores: Optional[np.ndarray] = None,
+                            target_weights: Optional[np.ndarray] = None) -> None:
+    # Brandes' dependency accumulation, one level at a time from the farthest
+    # level back to the source (the stack popped in reverse level order); the
+    # amount passed along each DAG edge is that edge's share of the source's
+    # edge betweenness, so it is also added to `edge_scores` if given
+    # (`edge_ids` maps CSR slots to edge IDs); `target_weights` counts each
+    # target vertex that many times instead of once
+    sigma, delta = buf.sigma, buf.delta
+    for level in range(nlevels - 1, -1, -1):
+        lo = buf.level_offsets[level]
+        hi = buf.level_offsets[level + 1]
+        u = buf.pred_u[lo:hi]
+        v = buf.pred_v[lo:hi]
+        target_weight = 1.0 if target_weights is None else target_weights[v]
+        flow = sigma[u]/sigma[v]*(target_weight + delta[v])
+        np.add.at(delta, u, flow)
+        if edge_scores is not None:
+            np.add.at(edge_scores, edge_ids[buf.pred_slot[lo:hi]], flow)
+
+def reset_brandes_buffers(buf: BrandesBuffers, nvisited: int) -> None:
+    visited = buf.stack[:nvisited]
+    buf.dists[visited] = -1
+    buf.wdists[visited] = np.inf
+    buf.sigma[visited] = 0.0
+    buf.delta[visited] = 0.0
+
+def add_source_dependencies(s: int, offsets: np.ndarray, neighbors: np.ndarray,
+                            buf: BrandesBuffers, scores: np.ndarray,
+                            edge_ids: Optional[np.ndarray] = None,
+                            edge_scores: Optional[np.ndarray] = None,
+                            weights: Optional[np.ndarray] = None) -> None:
+    # `weights` selects the Dijkstra kernel; without weights, the BFS kernel is
+    # the unit-weight fast path
+    if weights is None:
+        (nvisited, nlevels) = single_source_shortest_path_dag(s, offsets, neighbors, buf)
+    else:
+        (nvisited, nlevels) = single_source_dijkstra_dag(s, offsets, neighbors, weights, buf)
+    accumulate_dependencies(buf, nlevels, edge_ids, edge_scores)
+    # the source itself is not an intermediate vertex, so skip stack[0]
+    reached = buf.stack[1:nvisited]
+    scores[reached] += buf.delta[reached]
+    reset_brandes_buffers(buf, nvisited)
+
+def all_vertices_betweenness_centrality_csr(g: List[List[int]],
+                                            sources: Optional[Iterable[int]] = None) -> np.ndarray:
+    # same scores as `g.betweenness(directed=False)`; `g` is an adjacency list
+    # or an (offsets, neighbors) tuple; `sources` restricts the sum to some sources
+    (offsets, neighbors) = adjlist_to_csr(g) if isinstance(g, list) else g
+    N = len(offsets) - 1
+    buf = make_brandes_buffers(N, len(neighbors))
+    scores = np.zeros(N)
+    for s in (range(0, N) if sources is None else sources):
+        add_source_dependencies(s, offsets, neighbors, buf, scores)
+    # each undirected path was counted once from each of its two endpoints
+    return scores/2.0
+
+all_vertices_betweenness_centrality_csr(g_adjlist)
+
+# Each source's dependency accumulation is independent of the others, so the
+# sources can be split into chunks across worker processes. The CSR arrays are
+# published once in shared memory; each worker attaches to them (no copy) and
+# allocates its own Brandes buffers once, in the pool initializer. Each chunk
+# is accumulated into its own private score vector, and the vectors are summed
+# at the end.
+
+# per-process state of a worker, set up by `init_betweenness_worker`
+betweenness_worker_state = {}
+
+def share_array(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, tuple]:
+    # copy `array` into a new shared memory block; the returned spec is what a
+    # worker needs to attach to it
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return (shm, (shm.name, array.shape, array.dtype.str))
+
+def attach_shared_array(spec: tuple) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    (name, shape, dtype) = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+def init_betweenness_worker(offsets_spec: tuple, neighbors_spec: tuple,
+                            weights_spec: Optional[tuple] = None) -> None:
+    (offsets_shm, offsets) = attach_shared_array(offsets_spec)
+    (neighbors_shm, neighbors) = attach_shared_array(neighbors_spec)
+    shms = [offsets_shm, neighbors_shm]
+    weights = None
+    if weights_spec is not None:
+        (weights_shm, weights) = attach_shared_array(weights_spec)
+        shms.append(weights_shm)
+    N = len(offsets) - 1
+    # keep the SharedMemory objects referenced, or the arrays lose their buffer
+    betweenness_worker_state.update(shms=shms, offsets=offsets, neighbors=neighbors,
+                                    weights=weights,
+                                    buf=make_brandes_buffers(N, len(neighbors)))
+
+def betweenness_worker_chunk(sources: np.ndarray) -> np.ndarray:
+    state = betweenness_worker_state
+    offsets = state["offsets"]
+    scores = np.zeros(len(offsets) - 1)
+    for s in sources:
+        add_source_dependencies(s, offsets, state["neighbors"], state["buf"], scores,
+                                weights=state["weights"])
+    return scores
+
+def parallel_betweenness_centrality(g: List[List[int]], nworkers: Optional[int] = None,
+                                    nchunks: Optional[int] = None,
+                                    mp_context=None,
+                                    weights: Optional[np.ndarray] = None,
+                                    directed: bool = False) -> np.ndarray:
+    # same scores as `all_vertices_betweenness_centrality_csr` (up to the order
+    # of the floating-point additions); `nchunks` defaults to 4 chunks per
+    # worker, so that a slow chunk does not leave the other workers idle;
+    # `weights` (parallel to the CSR neighbors) and `directed` are as in
+    # `betweenness_centrality`
+    (offsets, neighbors) = adjlist_to_csr(g) if isinstance(g, list) else g
+    N = len(offsets) - 1
+    nworkers = os.cpu_count() if nworkers is None else nworkers
+    nchunks = 4*nworkers if nchunks is None else nchunks
+    chunks = [chunk for chunk in np.array_split(np.arange(N), nchunks) if len(chunk) > 0]
+    (offsets_shm, offsets_spec) = share_array(np.ascontiguousarray(offsets))
+    (neighbors_shm, neighbors_spec) = share_array(np.ascontiguousarray(neighbors))
+    shms = [offsets_shm, neighbors_shm]
+    weights_spec = None
+    if weights is not None:
+        (weights_shm, weights_spec) = share_array(np.ascontiguousarray(weights, dtype=np.float64))
+        shms.append(weights_shm)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nworkers,
+                                                    mp_context=mp_context,
+                                                    initializer=init_betweenness_worker,
+                                                    initargs=(offsets_spec, neighbors_spec,
+                                                              weights_spec)) as pool:
+            scores = np.zeros(N)
+            for chunk_scores in pool.map(betweenness_worker_chunk, chunks):
+                scores += chunk_scores
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    return scores if directed else scores/2.0
+
+parallel_betweenness_centrality(g_adjlist, nworkers=2)
+
+# Approximate betweenness by sampling sources uniformly at random (with
+# replacement) and averaging their dependency vectors. With
+# X_s(v) = delta_s(v)/(N-2), which lies in [0, 1], the betweenness is
+# BC(v) = N(N-2)/2 * E[X(v)]. The per-vertex intervals are the tighter of two
+# bounds, each allowed half of the failure probability `delta`, so that all
+# of them hold together with probability at least 1 - delta:
+# - Hoeffding's inequality with a union bound over all N vertices: with
+#   r >= ln(4N/delta)/(2 epsilon^2) samples, every E[X(v)] is within
+#   +/- epsilon with probability at least 1 - delta/2, so epsilon is an error
+#   on the scale of betweenness divided by N(N-2)/2
+# - the empirical Bernstein bound (Maurer & Pontil, 2009), two-sided and with
+#   the same union bound, so ln(8N/delta); it is much narrower for the many
+#   vertices whose dependencies barely vary
+# The per-sample kernel is the same BFS-with-path-counts as above.
+
+ApproximateBetweenness = collections.namedtuple("ApproximateBetweenness",
+                                                ["scores", "lower", "upper",
+                                                 "nsamples", "stopped_early"])
+
+def approximate_betweenness_centrality(g: List[List[int]], epsilon: float = 0.01,
+                                       delta: float = 0.1, top_k: Optional[int] = None,
+                                       batch_size: int = 100, patience: int = 3,
+                                       seed: Optional[int] = None) -> ApproximateBetweenness:
+    # if `top_k` is given, sampling stops early once the set of the `top_k`
+    # highest-scoring vertices has not changed for `patience` batches in a row
+    (offsets, neighbors) = adjlist_to_csr(g) if isinstance(g, list) else g
+    N = len(offsets) - 1
+    if N < 3:
+        return ApproximateBetweenness(np.zeros(N), np.zeros(N), np.zeros(N), 0, False)
+    hoeffding_log_term = np.log(4.0*N/delta)
+    bernstein_log_term = np.log(8.0*N/delta)
+    nsamples = int(np.ceil(hoeffding_log_term/(2.0*epsilon**2)))
+    if nsamples >= N:
+        # sampling would cost more than the exact computation
+        scores = all_vertices_betweenness_centrality_csr((offsets, neighbors))
+        return ApproximateBetweenness(scores, scores.copy(), scores.copy(), N, False)
+    rng = np.random.default_rng(seed)
+    buf = make_brandes_buffers(N, len(neighbors))
+    totals = np.zeros(N)
+    squared_totals = np.zeros(N)
+    r = 0
+    previous_top = None
+    stable_batches = 0
+    stopped_early = False
+    while r < nsamples:
+        for s in rng.integers(0, N, size=min(batch_size, nsamples - r)):
+            (nvisited, nlevels) = single_source_shortest_path_dag(s, offsets, neighbors, buf)
+            accumulate_dependencies(buf, nlevels)
+            reached = buf.stack[1:nvisited]
+            x = buf.delta[reached]/(N - 2.0)
+            totals[reached] += x
+            squared_totals[reached] += x*x
+            reset_brandes_buffers(buf, nvisited)
+            r += 1
+        if top_k is not None:
+            top = frozenset(np.argpartition(-totals, top_k - 1)[:top_k].tolist())
+            stable_batches = stable_batches + 1 if top == previous_top else 0
+            previous_top = top
+            if stable_batches >= patience and r < nsamples:
+                stopped_early = True
+                break
+    means = totals/r
+    half_widths = np.full(N, np.sqrt(hoeffding_log_term/(2.0*r)))
+    if r > 1:
+        variances = np.maximum(squared_totals/r - means**2, 0.0)*r/(r - 1.0)
+        bernstein = np.sqrt(2.0*variances*bernstein_log_term/r) + \
+            7.0*bernstein_log_term/(3.0*(r - 1.0))
+        half_widths = np.minimum(half_widths, bernstein)
+    scale = N*(N - 2.0)/2.0
+    return ApproximateBetweenness(means*scale, np.maximum(means - half_widths, 0.0)*scale,
+                                  (means + half_widths)*scale, r, stopped_early)
+
+approximate_betweenness_centrality(igraph.Graph.Barabasi(2000, 3).get_adjlist(),
+                                   epsilon=0.05, top_k=10, seed=1337)
+
+# Betweenness maintained under edge insertions and deletions. Only the sources
+# whose shortest-path DAG can change are recomputed: their old dependency
+# vector is subtracted from the running sums and the new one is added. In an
+# undirected graph d(s, a) is the BFS distance from `a` to `s`, so one BFS from
+# each endpoint of the updated edge (a, b) finds those sources:
+# - inserting (a, b) changes the DAG of `s` iff d(s, a) != d(s, b)
+# - deleting (a, b) changes it iff |d(s, a) - d(s, b)| == 1, i.e. the edge lies
+#   on a shortest path from `s`
+# Memory/time trade-off: with `store_dependencies=True` every source's
+# dependency vector is kept (O(N^2) memory) so that each affected source costs
+# one Brandes pass; otherwise only O(N + E) is kept and the old vector is
+# recomputed on the graph before the update, so each affected source costs two.
+# When more than `max_affected_fraction` of the sources are affected, the
+# scores are simply recomputed from scratch. The scores equal a from-scratch
+# run up to floating-point rounding; `recompute` resynchronizes them exactly.
+
+class DynamicBetweenness:
+    def __init__(self, g: List[List[int]], store_dependencies: bool = False,
+                 max_affected_fraction: float = 0.5):
+        self.adjacency = [set(neighbors) for neighbors in g]
+        self.store_dependencies = store_dependencies
+        self.max_affected_fraction = max_affected_fraction
+        self.recompute()
+
+    def csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        return adjlist_to_csr([sorted(neighbors) for neighbors in self.adjacency])
+
+    def source_dependencies(self, s: int, offsets: np.ndarray, neighbors: np.ndarray,
+                            buf: BrandesBuffers) -> np.ndarray:
+        # the dependency of every vertex on source `s` (zero for `s` itself)
+        (nvisited, nlevels) = single_source_shortest_path_dag(s, offsets, neighbors, buf)
+        accumulate_dependencies(buf, nlevels)
+        dependencies = np.zeros(len(offsets) - 1)
+        reached = buf.stack[1:nvisited]
+        dependencies[reached] = buf.delta[reached]
+        reset_brandes_buffers(buf, nvisited)
+        return dependencies
+
+    def bfs_distances(self, s: int, offsets: np.ndarray, neighbors: np.ndarray,
+                      buf: BrandesBuffers) -> np.ndarray:
+        # -1 marks the vertices that are not reachable from `s`
+        (nvisited, _) = single_source_shortest_path_dag(s, offsets, neighbors, buf)
+        dists = buf.dists.copy()
+        reset_brandes_buffers(buf, nvisited)
+        return dists
+
+    def recompute(self) -> None:
+        (offsets, neighbors) = self.csr()
+        N = len(self.adjacency)
+        buf = make_brandes_buffers(N, len(neighbors))
+        self.sums = np.zeros(N)
+        self.dependencies = np.zeros((N, N)) if self.store_dependencies else None
+        for s in range(0, N):
+            dependencies = self.source_dependencies(s, offsets, neighbors, buf)
+            self.sums += dependencies
+            if self.store_dependencies:
+                self.dependencies[s] = dependencies
+
+    def scores(self) -> np.ndarray:
+        # same scale as `g.betweenness(directed=False)`
+        return self.sums/2.0
+
+    def add_vertices(self, count: int) -> None:
+        # new vertices are isolated, so no existing score changes
+        N = len(self.adjacency)
+        self.adjacency.extend(set() for _ in range(count))
+        self.sums = np.concatenate((self.sums, np.zeros(count)))
+        if self.store_dependencies:
+            self.dependencies = np.pad(self.dependencies, ((0, count), (0, count)))
+
+    def add_edge(self, a: int, b: int) -> int:
+        # returns the number of sources that were recomputed
+        if a == b or b in self.adjacency[a]:
+            return 0
+        return self.update_edge(a, b, inserting=True)
+
+    def remove_edge(self, a: int, b: int) -> int:
+        if b not in self.adjacency[a]:
+            return 0
+        return self.update_edge(a, b, inserting=False)
+
+    def update_edge(self, a: int, b: int, inserting: bool) -> int:
+        N = len(self.adjacency)
+        (offsets, neighbors) = self.csr()
+        buf = make_brandes_buffers(N, len(neighbors) + 2)
+        dists_a = self.bfs_distances(a, offsets, neighbors, buf)
+        dists_b = self.bfs_distances(b, offsets, neighbors, buf)
+        if inserting:
+            affected = np.nonzero(dists_a != dists_b)[0]
+        else:
+            affected = np.nonzero(np.abs(dists_a - dists_b) == 1)[0]
+        full_recompute = len(affected) > self.max_affected_fraction*N
+        if not full_recompute:
+            for s in affected:
+                if self.store_dependencies:
+                    self.sums -= self.dependencies[s]
+                else:
+                    self.sums -= self.source_dependencies(s, offsets, neighbors, buf)
+        if inserting:
+            self.adjacency[a].add(b)
+            self.adjacency[b].add(a)
+        else:
+            self.adjacency[a].discard(b)
+            self.adjacency[b].discard(a)
+        if full_recompute:
+            self.recompute()
+            return N
+        (offsets, neighbors) = self.csr()
+        for s in affected:
+            dependencies = self.source_dependencies(s, offsets, neighbors, buf)
+            self.sums += dependencies
+            if self.store_dependencies:
+                self.dependencies[s] = dependencies
+        return len(affected)
+
+dynamic_betweenness = DynamicBetweenness(tg_adjlist)
+dynamic_betweenness.add_edge(0, 10)
+dynamic_betweenness.scores()
+
+# A checkpointed run processes the sources in increasing order, in chunks, and
+# after every chunk atomically replaces a compact binary checkpoint (an .npz
+# holding the float64 accumulator, the completed sources as a packed bit mask,
+# and a fingerprint of the graph). A restarted run loads the checkpoint and
+# carries on with the remaining sources. The additions to the accumulator
+# happen in the same order as in an uninterrupted run, so the final scores are
+# bit-identical to those of `all_vertices_betweenness_centrality_csr`.
+
+def graph_fingerprint(offsets: np.ndarray, neighbors: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(neighbors, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+def write_betweenness_checkpoint(checkpoint_path: str, scores: np.ndarray,
+                                 done: np.ndarray, fingerprint: str) -> None:
+    # write to a temporary file first, so that a crash mid-write never
+    # leaves a truncated checkpoint behind
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, scores=scores, done=np.packbits(done), fingerprint=np.array(fingerprint))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path)
+
+def checkpointed_betweenness_centrality(g: List[List[int]], checkpoint_path: str,
+                                        chunk_size: int = 1000,
+                                        progress: bool = True) -> np.ndarray:
+    (offsets, neighbors) = adjlist_to_csr(g) if isinstance(g, list) else g
+    N = len(offsets) - 1
+    fingerprint = graph_fingerprint(offsets, neighbors)
+    scores = np.zeros(N)
+    done = np.zeros(N, dtype=bool)
+    if os.path.exists(checkpoint_path):
+        with np.load(checkpoint_path) as checkpoint:
+            if str(checkpoint["fingerprint"]) != fingerprint:
+                raise ValueError("checkpoint %s was written for a different graph" % checkpoint_path)
+            scores = checkpoint["scores"].copy()
+            done = np.unpackbits(checkpoint["done"], count=N).astype(bool)
+    remaining = np.nonzero(~done)[0]
+    buf = make_brandes_buffers(N, len(neighbors))
+    start_time = timeit.default_timer()
+    nprocessed = 0
+    for lo in range(0, len(remaining), chunk_size):
+        chunk = remaining[lo:lo + chunk_size]
+        for s in chunk:
+            add_source_dependencies(s, offsets, neighbors, buf, scores)
+        done[chunk] = True
+        write_betweenness_checkpoint(checkpoint_path, scores, done, fingerprint)
+        nprocessed += len(chunk)
+        if progress:
+            elapsed = timeit.default_timer() - start_time
+            eta = elapsed/nprocessed*(len(remaining) - nprocessed)
+            print("%d/%d sources done, %.1f s elapsed, ETA %.1f s" %
+                  (np.count_nonzero(done), N, elapsed, eta))
+    return scores/2.0
+
+checkpointed_betweenness_centrality(g_adjlist, "betweenness_checkpoint.npz", chunk_size=5)
+
+# Edge betweenness comes out of the same pass, given the ID of the edge behind
+# every CSR slot. `edgelist_to_csr` builds the CSR arrays from an edge list
+# (e.g. `g.get_edgelist()`), so that the edge scores are in the same order as
+# `g.es`. A directed graph keeps only the out-neighbors (which is what the
+# forward search follows), and the optional edge weights are permuted along
+# with the neighbors.
+
+def edgelist_to_csr(N: int, edges: List[Tuple[int, int]], directed: bool = False,
+                    weights: Optional[List[float]] = None) -> \
+Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    ids = np.arange(len(edges))
+    src = edges[:, 0]
+    dst = edges[:, 1]
+    if not directed:
+        (src, dst) = (np.concatenate((src, dst)), np.concatenate((dst, src)))
+        ids = np.concatenate((ids, ids))
+    order = np.lexsort((dst, src))
+    offsets = np.zeros(N + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(src, minlength=N))
+    slot_weights = None
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+        if np.any(weights <= 0):
+            raise ValueError("edge weights must be positive")
+        slot_weights = weights[ids[order]]
+    return (offsets, dst[order], ids[order], slot_weights)
+
+def vertex_and_edge_betweenness_centrality(N: int, edges: List[Tuple[int, int]],
+                                           directed: bool = False,
+                                           weights: Optional[List[float]] = None) -> \
+Tuple[np.ndarray, np.ndarray]:
+    # same scores as `g.betweenness(directed=...)` and
+    # `g.edge_betweenness(directed=...)`
+    (offsets, neighbors, edge_ids, slot_weights) = edgelist_to_csr(N, edges, directed, weights)
+    buf = make_brandes_buffers(N, len(neighbors))
+    scores = np.zeros(N)
+    edge_scores = np.zeros(len(edges))
+    for s in range(0, N):
+        add_source_dependencies(s, offsets, neighbors, buf, scores, edge_ids, edge_scores,
+                                slot_weights)
+    if directed:
+        return (scores, edge_scores)
+    return (scores/2.0, edge_scores/2.0)
+
+# Girvan-Newman divisive clustering: repeatedly delete the edge with the highest
+# edge betweenness. Edge betweenness only depends on the component an edge is
+# in, so after each deletion only the edges of the component that contained
+# the deleted edge (now possibly split in two) are rescored. The partition with
+# the highest modularity (on the original graph) is returned.
+
+GirvanNewmanResult = collections.namedtuple("GirvanNewmanResult",
+                                            ["membership", "modularity",
+                                             "removed_edges", "modularities"])
+
+def modularity(membership: np.ndarray, edges: np.ndarray, degrees: np.ndarray) -> float:
+    m = float(len(edges))
+    if m == 0:
+        return 0.0
+    inside = membership[edges[:, 0]] == membership[edges[:, 1]]
+    community_degrees = np.bincount(membership, weights=degrees)
+    return np.count_nonzero(inside)/m - np.sum((community_degrees/(2.0*m))**2)
+
+def reachable_vertices(start: int, adjacency: List[Set[int]]) -> Set[int]:
+    reached = {start}
+    work = collections.deque([start])
+    while len(work) > 0:
+        u = work.popleft()
+        for v in adjacency[u]:
+            if v not in reached:
+                reached.add(v)
+                work.append(v)
+    return reached
+
+def girvan_newman(N: int, edges: List[Tuple[int, int]],
+                  max_communities: Optional[int] = None) -> GirvanNewmanResult:
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    degrees = np.bincount(edges.ravel(), minlength=N)
+    adjacency = [set() for _ in range(0, N)]
+    for (a, b) in edges.tolist():
+        adjacency[a].add(b)
+        adjacency[b].add(a)
+    alive = np.ones(len(edges), dtype=bool)
+    (_, edge_scores) = vertex_and_edge_betweenness_centrality(N, edges)
+    membership = np.full(N, -1, dtype=np.int64)
+    ncommunities = 0
+    for v in range(0, N):
+        if membership[v] < 0:
+            membership[list(reachable_vertices(v, adjacency))] = ncommunities
+            ncommunities += 1
+    best_membership = membership.copy()
+    best_modularity = modularity(membership, edges, degrees)
+    modularities = [(ncommunities, best_modularity)]
+    removed_edges = []
+    while np.any(alive) and (max_communities is None or ncommunities < max_communities):
+        e = int(np.argmax(np.where(alive, edge_scores, -np.inf)))
+        (a, b) = edges[e].tolist()
+        alive[e] = False
+        adjacency[a].discard(b)
+        adjacency[b].discard(a)
+        removed_edges.append(e)
+        component = reachable_vertices(a, adjacency)
+        if b not in component:
+            # the deleted edge split its component in two
+            other_component = reachable_vertices(b, adjacency)
+            membership[list(other_component)] = ncommunities
+            ncommunities += 1
+            component |= other_component
+            q = modularity(membership, edges, degrees)
+            modularities.append((ncommunities, q))
+            if q > best_modularity:
+                best_modularity = q
+                best_membership = membership.copy()
+        # rescore the edges of the affected component on its own subgraph
+        in_component = np.zeros(N, dtype=bool)
+        vertices = np.array(sorted(component), dtype=np.int64)
+        in_component[vertices] = True
+        component_edge_ids = np.nonzero(alive & in_component[edges[:, 0]])[0]
+        local_index = np.zeros(N, dtype=np.int64)
+        local_index[vertices] = np.arange(len(vertices))
+        (_, component_edge_scores) = vertex_and_edge_betweenness_centrality(
+            len(vertices), local_index[edges[component_edge_ids]])
+        edge_scores[component_edge_ids] = component_edge_scores
+    return GirvanNewmanResult(best_membership, best_modularity, removed_edges, modularities)
+
+karate = igraph.Graph.Famous("Zachary")
+girvan_newman(karate.vcount(), karate.get_edgelist())
+
+# One entry point for undirected, directed and weighted betweenness, with the
+# serial and the parallel driver sharing the same kernels and dependency
+# accumulation. Weights that are all 1 take the unit-weight BFS fast path.
+
+def betweenness_centrality(N: int, edges: List[Tuple[int, int]], directed: bool = False,
+                           weights: Optional[List[float]] = None,
+                           nworkers: int = 1) -> np.ndarray:
+    # same scores as `g.betweenness(directed=directed, weights=weights)`
+    (offsets, neighbors, _, slot_weights) = edgelist_to_csr(N, edges, directed, weights)
+    if slot_weights is not None and np.all(slot_weights == 1.0):
+        slot_weights = None
+    if nworkers > 1:
+        return parallel_betweenness_centrality((offsets, neighbors), nworkers=nworkers,
+                                               weights=slot_weights, directed=directed)
+    buf = make_brandes_buffers(N, len(neighbors))
+    scores = np.zeros(N)
+    for s in range(0, N):
+        add_source_dependencies(s, offsets, neighbors, buf, scores, weights=slot_weights)
+    return scores if directed else scores/2.0
+
+# e.g. for the directed metabolic network in human_metabolic_network.py:
+# betweenness_centrality(g.vcount(), g.get_edgelist(), directed=True)
+dg = igraph.Graph.Barabasi(100, 2, directed=True)
+dg_weights = [random.randint(1, 3) for _ in range(dg.ecount())]
+betweenness_centrality(dg.vcount(), dg.get_edgelist(), directed=True, weights=dg_weights)
+
+# Degree-1 pruning for undirected graphs. A vertex `v` with a single neighbor
+# `u` can be folded into `u`: every shortest path between the vertices folded
+# into `v` (its "reach", including `v` itself) and the rest of the graph runs
+# through the edge (v, u). Counting ordered (source, target) pairs, with `n` the
+# size of the component:
+# - `v` lies on the paths from the rest of its reach to the n - reach[v]
+#   vertices outside it: 2*(reach[v] - 1)*(n - reach[v])
+# - `u` lies on the paths between the reach of `v` and the vertices already
+#   folded into `u`: 2*reach[v]*(reach[u] - 1)
+# after which reach[u] += reach[v]. Folding repeats as long as there are degree-1
+# vertices, so whole tree-like appendages collapse. Brandes then runs on the
+# remaining core only, with every target counted reach[t] times and every
+# source's dependencies scaled by reach[s]; the pairs that start or end inside
+# a core vertex's folded tree also pass through that core vertex, which adds
+# (reach[s] - 1)*reach[t] and reach[s]*(reach[t] - 1) for each reachable pair.
+# The resulting scores are those of the whole, unreduced graph.
+
+def fold_degree_one_vertices(N: int, edges: np.ndarray) -> \
+Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # returns (mask of the core vertices, reach, ordered-pair scores gathered
+    # while folding)
+    adjacency = [set() for _ in range(0, N)]
+    for (a, b) in edges.tolist():
+        if a != b:
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+    component_sizes = np.zeros(N, dtype=np.int64)
+    for v in range(0, N):
+        if component_sizes[v] == 0:
+            component = list(reachable_vertices(v, adjacency))
+            component_sizes[component] = len(component)
+    reach = np.ones(N)
+    scores = np.zeros(N)
+    core = np.ones(N, dtype=bool)
+    work = collections.deque(v for v in range(0, N) if len(adjacency[v]) == 1)
+    while len(work) > 0:
+        v = work.popleft()
+        if len(adjacency[v]) != 1:
+            continue
+        u = adjacency[v].pop()
+        adjacency[u].discard(v)
+        scores[v] += 2.0*(reach[v] - 1.0)*(component_sizes[v] - reach[v])
+        scores[u] += 2.0*reach[v]*(reach[u] - 1.0)
+        reach[u] += reach[v]
+        core[v] = False
+        if len(adjacency[u]) == 1:
+            work.append(u)
+    return (core, reach, scores)
+
+def pruned_betweenness_centrality(N: int, edges: List[Tuple[int, int]],
+                                  weights: Optional[List[float]] = None) -> np.ndarray:
+    # same scores as `g.betweenness(directed=False, weights=weights)`, for a
+    # simple undirected graph
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    (core, reach, scores) = fold_degree_one_vertices(N, edges)
+    core_vertices = np.nonzero(core)[0]
+    local_index = np.full(N, -1, dtype=np.int64)
+    local_index[core_vertices] = np.arange(len(core_vertices))
+    core_edge_mask = core[edges[:, 0]] & core[edges[:, 1]]
+    core_weights = None if weights is None else np.asarray(weights, dtype=np.float64)[core_edge_mask]
+    (offsets, neighbors, _, slot_weights) = edgelist_to_csr(len(core_vertices),
+                                                            local_index[edges[core_edge_mask]],
+                                                            weights=core_weights)
+    core_reach = reach[core_vertices]
+    core_scores = np.zeros(len(core_vertices))
+    buf = make_brandes_buffers(len(core_vertices), len(neighbors))
+    for s in range(0, len(core_vertices)):
+        if slot_weights is None:
+            (nvisited, nlevels) = single_source_shortest_path_dag(s, offsets, neighbors, buf)
+        else:
+            (nvisited, nlevels) = single_source_dijkstra_dag(s, offsets, neighbors, slot_weights, buf)
+        accumulate_dependencies(buf, nlevels, target_weights=core_reach)
+        reached = buf.stack[1:nvisited]
+        core_scores[reached] += core_reach[s]*buf.delta[reached]
+        core_scores[s] += (core_reach[s] - 1.0)*np.sum(core_reach[reached])
+        core_scores[reached] += core_reach[s]*(core_reach[reached] - 1.0)
+        reset_brandes_buffers(buf, nvisited)
+    scores[core_vertices] += core_scores
+    return scores/2.0
+
+pruned_betweenness_centrality(tg.vcount(), tg.get_edgelist())
\ No newline at end of file
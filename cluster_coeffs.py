@@ -5,6 +5,7 @@
 !pip install python-igraph pympler
 !pip install --only-binary=:all: bintrees
 import cairo, igraph, pandas, numpy, timeit, pympler.asizeof, bintrees, matplotlib
+import bisect, collections, itertools, statistics
 
 !curl https://csx46.s3-us-west-2.amazonaws.com/PathwayCommons9.All.hgnc.sif.gz --output PathwayCommons9.All.hgnc.sif.gz
 !gunzip -f PathwayCommons9.All.hgnc.sif.gz
@@ -45,6 +46,51 @@ def find_bst_forest(bst_forest, i, j):
 
 ppi_adj_forest = get_bst_forest(ppi_adj_list)
 
+# membership index replacing the BST forest: every vertex's sorted neighbors are
+# an int32 run inside one contiguous buffer (neighbors[offsets[i]:offsets[i+1]]),
+# and hubs whose degree is at least n/32 (so that an n-bit bitmap is no bigger
+# than their run of 32-bit neighbor IDs) also get a row of packed bits in
+# `hub_bits`; `hub_rows[i]` is that row, or -1 for a non-hub. `views` holds
+# memoryviews of those four arrays for the scalar lookups: indexing a
+# memoryview gives a plain int, where indexing the array creates a numpy
+# scalar, which made every bisect comparison as slow as an AVL tree step
+SortedNeighborIndex = collections.namedtuple("SortedNeighborIndex",
+                                             ["offsets", "neighbors", "hub_rows", "hub_bits", "views"])
+
+def get_sorted_index(theadjlist):
+    n = len(theadjlist)
+    degrees = numpy.array([len(a) for a in theadjlist], dtype=numpy.int64)
+    offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum(degrees)
+    neighbors = numpy.fromiter(itertools.chain.from_iterable(sorted(a) for a in theadjlist),
+                               dtype=numpy.int32, count=offsets[n])
+    hubs = numpy.nonzero(32*degrees >= n)[0]
+    hub_rows = numpy.full(n, -1, dtype=numpy.int32)
+    hub_rows[hubs] = numpy.arange(len(hubs))
+    hub_bits = numpy.zeros((len(hubs), (n + 7)//8), dtype=numpy.uint8)
+    hub_degrees = degrees[hubs]
+    slots = numpy.concatenate([numpy.arange(offsets[i], offsets[i + 1]) for i in hubs] +
+                              [numpy.zeros(0, dtype=numpy.int64)])
+    rows = numpy.repeat(numpy.arange(len(hubs)), hub_degrees)
+    hub_nbrs = neighbors[slots]
+    numpy.bitwise_or.at(hub_bits, (rows, hub_nbrs >> 3), (1 << (hub_nbrs & 7)).astype(numpy.uint8))
+    views = tuple(memoryview(a) for a in (offsets, neighbors, hub_rows, hub_bits))
+    return SortedNeighborIndex(offsets, neighbors, hub_rows, hub_bits, views)
+
+def find_sorted_index(sorted_index, i, j):
+    # drop-in replacement for find_bst_forest: a bit test for hubs, otherwise a
+    # binary search of vertex i's neighbor run
+    (offsets, neighbors, hub_rows, hub_bits) = sorted_index.views
+    row = hub_rows[i]
+    if row >= 0:
+        return bool((hub_bits[row, j >> 3] >> (j & 7)) & 1)
+    lo = offsets[i]
+    hi = offsets[i + 1]
+    k = bisect.bisect_left(neighbors, j, lo, hi)
+    return k < hi and neighbors[k] == j
+
+ppi_adj_index = get_sorted_index(ppi_adj_list)
+
 N = len(ppi_adj_list)
 civals = numpy.zeros(100)
 civals[:] = numpy.NaN
@@ -57,7 +103,7 @@ for n in range(0, 100): # loop over all vertices
         nctr = 0
         for i in range(0, nneighbors):# 0 to nneighbors
             for j in range(i + 1, nneighbors):# 1+1 to nneighbors
-                if neighbors[j] in ppi_adj_forest[neighbors[i]]:
+                if find_sorted_index(ppi_adj_index, neighbors[i], neighbors[j]):
                     nctr += 1 # check for j neighbor of i
                     # increment nctr
         civals[n] = nctr/(nneighbors*(nneighbors-1)/2)
@@ -79,12 +125,360 @@ matplotlib.pyplot.xlabel("Ci (my code)")
 matplotlib.pyplot.ylabel("Ci (igraph)")
 matplotlib.pyplot.show()
 
+# Triangle counting with the forward algorithm: relabel the vertices by
+# increasing (degree, ID) and orient every edge from its lower to its higher
+# label, which leaves each vertex with at most sqrt(2m) out-neighbors, even
+# for hubs. Every triangle a < b < c is then found exactly once, as the wedge
+# (a -> b, a -> c) of two out-neighbors of `a` closed by the edge b -> c. The
+# wedges are enumerated in blocks of at most `block_wedges` and closed with one
+# `searchsorted` over the sorted b*n + c keys of the oriented edges, whose
+# positions are also the CSR slots of those edges. Like igraph, the graph is
+# treated as simple (self-loops and repeated edges are ignored).
+TriangleCounts = collections.namedtuple("TriangleCounts",
+                                        ["triangles", "clustering", "edge_support", "transitivity"])
+
+def count_triangles(g, block_wedges=1 << 22):
+    # per-vertex triangle counts, local clustering coefficients C_i (NaN for
+    # degree < 2, as in `transitivity_local_undirected`), the number of
+    # triangles on each edge of `g` (by edge ID) and the global transitivity
+    n = len(g.vs)
+    edges = numpy.array(g.get_edgelist(), dtype=numpy.int64).reshape(-1, 2)
+    edges = numpy.sort(edges, axis=1)
+    (pairs, pair_ids) = numpy.unique(edges[:, 0]*n + edges[:, 1], return_inverse=True)
+    simple_edges = numpy.stack([pairs // n, pairs % n], axis=1)
+    simple_edges = simple_edges[simple_edges[:, 0] != simple_edges[:, 1]]
+    degrees = numpy.bincount(simple_edges.ravel(), minlength=n)
+
+    # relabel by rank and orient each edge from the lower to the higher rank
+    order = numpy.lexsort((numpy.arange(n), degrees))
+    rank = numpy.empty(n, dtype=numpy.int64)
+    rank[order] = numpy.arange(n)
+    oriented = numpy.sort(rank[simple_edges], axis=1)
+    keys = oriented[:, 0]*n + oriented[:, 1]
+    edge_order = numpy.argsort(keys)
+    keys = keys[edge_order]
+    sources = oriented[edge_order, 0]
+    targets = oriented[edge_order, 1]
+    offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum(numpy.bincount(sources, minlength=n))
+
+    # every slot i pairs with the later slots of its source's run; split the
+    # slots into blocks holding about `block_wedges` wedges each
+    partners = offsets[sources + 1] - numpy.arange(len(keys)) - 1
+    wedge_ends = numpy.cumsum(partners)
+    block_starts = numpy.unique(numpy.searchsorted(wedge_ends, numpy.arange(0, wedge_ends[-1] if len(keys) > 0 else 0,
+                                                                            block_wedges), side="right"))
+    block_bounds = numpy.concatenate([block_starts, [len(keys)]]) if len(block_starts) > 0 else numpy.zeros(1, dtype=numpy.int64)
+
+    rank_triangles = numpy.zeros(n, dtype=numpy.int64)
+    support = numpy.zeros(len(keys), dtype=numpy.int64)
+    for (lo, hi) in zip(block_bounds[:-1], block_bounds[1:]):
+        counts = partners[lo:hi]
+        first = numpy.repeat(numpy.arange(lo, hi), counts)
+        second = first + 1 + numpy.arange(len(first)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        closing = numpy.minimum(numpy.searchsorted(keys, targets[first]*n + targets[second]), len(keys) - 1)
+        closed = keys[closing] == targets[first]*n + targets[second]
+        (first, second, closing) = (first[closed], second[closed], closing[closed])
+        rank_triangles += numpy.bincount(sources[first], minlength=n)
+        rank_triangles += numpy.bincount(targets[first], minlength=n)
+        rank_triangles += numpy.bincount(targets[second], minlength=n)
+        support += numpy.bincount(first, minlength=len(keys))
+        support += numpy.bincount(second, minlength=len(keys))
+        support += numpy.bincount(closing, minlength=len(keys))
+
+    triangles = rank_triangles[rank]
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        clustering = numpy.where(degrees > 1, 2.0*triangles/(degrees*(degrees - 1.0)), numpy.nan)
+    wedges = numpy.sum(degrees*(degrees - 1)//2)
+    # each triangle closes three wedges and added 3 to `rank_triangles`
+    transitivity = numpy.sum(rank_triangles)/wedges if wedges > 0 else numpy.nan
+
+    # map the support of each simple edge back to the edge IDs of `g`
+    simple_support = numpy.zeros(len(pairs), dtype=numpy.int64)
+    simple_keys = numpy.sort(rank[simple_edges], axis=1)
+    simple_keys = simple_keys[:, 0]*n + simple_keys[:, 1]
+    not_loop = pairs // n != pairs % n
+    simple_support[not_loop] = support[numpy.searchsorted(keys, simple_keys)]
+    return TriangleCounts(triangles, clustering, simple_support[pair_ids], transitivity)
+
+start_time = timeit.default_timer()
+ppi_triangles = count_triangles(ppi_igraph)
+print("%0.2f s" % (timeit.default_timer() - start_time))
+print(numpy.allclose(ppi_triangles.clustering, ppi_igraph.transitivity_local_undirected(), equal_nan=True))
+print(ppi_triangles.transitivity, ppi_igraph.transitivity_undirected())
+
+# Approximate clustering coefficients by wedge sampling: C_i is the fraction
+# of the wedges (pairs of neighbors) centered on `i` that are closed, so
+# checking random wedges estimates it as a binomial proportion, with a Wilson
+# score interval at the given confidence. Vertices with at most `exact_wedges`
+# wedges (by default `max_wedges`, the most a vertex is sampled) are counted
+# exactly instead, from the triangles found as in `count_triangles`, and so
+# is every vertex when that is less work than sampling. The others are
+# sampled in rounds of doubling size until the interval's half-width is
+# within `relative_error` of the estimate or `max_wedges` wedges have been
+# checked, so the work per vertex is bounded however large the hubs are.
+# Wedges are checked in blocks of about `block_wedges`.
+# mode="global" samples wedges uniformly over the whole graph (vertices in
+# proportion to their number of wedges) to estimate the global
+# transitivity, up to `max_wedges` samples in total. Results are reproducible
+# for a given `seed`.
+ApproximateClustering = collections.namedtuple("ApproximateClustering",
+                                               ["clustering", "lower", "upper", "samples"])
+
+def wilson_interval(hits, samples, z):
+    # Wilson score interval for `hits` successes out of `samples` trials
+    p = hits/samples
+    denominator = 1.0 + z*z/samples
+    center = (p + z*z/(2.0*samples))/denominator
+    half_width = z/denominator*numpy.sqrt(p*(1.0 - p)/samples + z*z/(4.0*samples*samples))
+    return (center - half_width, center + half_width)
+
+def get_wedge_blocks(counts, block_wedges):
+    # bounds of consecutive runs of `counts` summing to about `block_wedges`
+    ends = numpy.cumsum(counts)
+    starts = numpy.unique(numpy.searchsorted(ends, numpy.arange(0, ends[-1] if len(counts) > 0 else 0,
+                                                                block_wedges), side="right"))
+    bounds = numpy.concatenate([starts, [len(counts)]]) if len(starts) > 0 else numpy.zeros(1, dtype=numpy.int64)
+    return zip(bounds[:-1], bounds[1:])
+
+def approximate_clustering(g, relative_error=0.05, confidence=0.95, max_wedges=2000,
+                           exact_wedges=None, mode="local", seed=0, block_wedges=1 << 22):
+    # for mode="local", per-vertex estimates, interval bounds and numbers of
+    # wedges checked (NaN estimates for degree < 2, like
+    # `transitivity_local_undirected`); for mode="global", the same four
+    # fields as scalars
+    if exact_wedges is None:
+        exact_wedges = max_wedges
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence/2.0)
+    rng = numpy.random.default_rng(seed)
+
+    # simple undirected graph in CSR form, with the sorted u*n + v keys of both
+    # directions of every edge for the closure checks (deduplicated after a
+    # sort, which is much faster than numpy.unique on large integer arrays)
+    n = len(g.vs)
+    edges = numpy.array(g.get_edgelist(), dtype=numpy.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    keys = numpy.sort(numpy.concatenate([edges[:, 0]*n + edges[:, 1], edges[:, 1]*n + edges[:, 0]]))
+    keys = keys[numpy.diff(keys, prepend=-1) != 0]
+    neighbors = keys % n
+    degrees = numpy.bincount(keys // n, minlength=n)
+    offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum(degrees)
+    wedges = degrees*(degrees - 1)//2
+
+    def closed(a, b):
+        # looking up the queries in sorted order keeps the searches local in `keys`
+        queries = a*n + b
+        order = numpy.argsort(queries)
+        found = numpy.minimum(numpy.searchsorted(keys, queries[order]), len(keys) - 1)
+        is_closed = numpy.empty(len(queries), dtype=bool)
+        is_closed[order] = keys[found] == queries[order]
+        return is_closed
+
+    def sample_wedges(centers):
+        d = degrees[centers]
+        i = (rng.random(len(centers))*d).astype(numpy.int64)
+        j = (rng.random(len(centers))*(d - 1)).astype(numpy.int64)
+        j += j >= i
+        return closed(neighbors[offsets[centers] + i], neighbors[offsets[centers] + j])
+
+    if mode == "global":
+        weights = wedges/numpy.sum(wedges)
+        hits = 0
+        samples = 0
+        batch = 1024
+        while samples < max_wedges:
+            batch = min(batch, max_wedges - samples)
+            hits += numpy.sum(sample_wedges(rng.choice(n, size=batch, p=weights)))
+            samples += batch
+            (lower, upper) = wilson_interval(hits, samples, z)
+            if upper - lower <= 2.0*relative_error*hits/samples:
+                break
+            batch *= 2
+        return ApproximateClustering(hits/samples, lower, upper, samples)
+    elif mode != "local":
+        raise ValueError("mode must be 'local' or 'global'")
+
+    hits = numpy.zeros(n)
+    samples = numpy.zeros(n, dtype=numpy.int64)
+
+    # exact counts, as in `count_triangles`: with every edge oriented from the
+    # lower to the higher (degree, index) rank, each triangle is found once,
+    # from the pairs of higher neighbors of its lowest vertex, which has no
+    # more neighbors than the other two; so only the vertices up to the
+    # largest degree counted exactly need to be sources. When finding every
+    # triangle would check no more wedges than that plus sampling each other
+    # vertex to `max_wedges`, all vertices are counted exactly.
+    rank = numpy.empty(n, dtype=numpy.int64)
+    rank[numpy.lexsort((numpy.arange(n), degrees))] = numpy.arange(n)
+    higher = rank[neighbors] > rank[keys // n]
+    (up_sources, up_targets) = ((keys // n)[higher], neighbors[higher])
+    up_degrees = numpy.bincount(up_sources, minlength=n)
+    up_offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+    up_offsets[1:] = numpy.cumsum(up_degrees)
+    up_wedges = up_degrees*(up_degrees - 1)//2
+    is_exact = (degrees > 1) & (wedges <= exact_wedges)
+    max_exact_degree = numpy.max(degrees[is_exact], initial=-1)
+    if numpy.sum(up_wedges) <= numpy.sum(up_wedges[degrees <= max_exact_degree]) + \
+                               max_wedges*numpy.sum((degrees > 1) & ~is_exact):
+        is_exact = degrees > 1
+        max_exact_degree = numpy.max(degrees, initial=-1)
+    exact = numpy.nonzero(is_exact)[0]
+    slots = numpy.nonzero(degrees[up_sources] <= max_exact_degree)[0]
+    partners = up_offsets[up_sources[slots] + 1] - slots - 1
+    triangles = numpy.zeros(n)
+    for (lo, hi) in get_wedge_blocks(partners, block_wedges):
+        counts = partners[lo:hi]
+        first = numpy.repeat(slots[lo:hi], counts)
+        second = first + 1 + numpy.arange(len(first)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        is_closed = closed(up_targets[first], up_targets[second])
+        for corners in (up_sources[first], up_targets[first], up_targets[second]):
+            triangles += numpy.bincount(corners[is_closed], minlength=n)
+    hits[exact] = triangles[exact]
+    samples[exact] = wedges[exact]
+
+    # sampled estimates for the others
+    active = numpy.nonzero((degrees > 1) & ~is_exact)[0]
+    batch = 64
+    while len(active) > 0:
+        draws = numpy.minimum(batch, max_wedges - samples[active])
+        for (lo, hi) in get_wedge_blocks(draws, block_wedges):
+            centers = numpy.repeat(active[lo:hi], draws[lo:hi])
+            hits += numpy.bincount(centers, weights=sample_wedges(centers), minlength=n)
+        samples[active] += draws
+        (lower, upper) = wilson_interval(hits[active], samples[active], z)
+        done = (upper - lower <= 2.0*relative_error*hits[active]/samples[active]) | \
+               (samples[active] >= max_wedges)
+        active = active[~done]
+        batch *= 2
+
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        clustering = hits/samples
+        (lower, upper) = wilson_interval(hits, samples, z)
+    lower[exact] = clustering[exact]
+    upper[exact] = clustering[exact]
+    return ApproximateClustering(clustering, lower, upper, samples)
+
+start_time = timeit.default_timer()
+ppi_approximate_clustering = approximate_clustering(ppi_igraph, relative_error=0.05)
+print("%0.2f s" % (timeit.default_timer() - start_time))
+print(numpy.nanmax(numpy.abs(ppi_approximate_clustering.clustering - ppi_triangles.clustering)))
+print(approximate_clustering(ppi_igraph, mode="global", max_wedges=1000000))
+
+# Binned statistics of a per-vertex metric by degree (or any other key):
+# every value goes to the bin [bin_edges[j], bin_edges[j + 1]) holding its
+# key, and the per-bin counts, means and quantiles all come from one
+# `numpy.bincount` / `numpy.lexsort` pass instead of one boolean mask per bin.
+# Values that are NaN (e.g. C_i for degree < 2) or whose key falls outside the
+# bins are skipped.
+BinnedStatistics = collections.namedtuple("BinnedStatistics",
+                                          ["edges", "centers", "counts", "mean", "quantiles"])
+
+def get_bin_edges(keys, num_bins, scale="linear"):
+    # `num_bins` equal-width bins ("linear") or bins of equal width in log
+    # scale ("log", for keys > 0) spanning the keys
+    keys = numpy.asarray(keys, dtype=float)
+    if scale == "linear":
+        return numpy.linspace(numpy.min(keys), numpy.max(keys)*(1.0 + 1e-12) + 1e-12, num_bins + 1)
+    elif scale == "log":
+        positive = keys[keys > 0]
+        return numpy.geomspace(numpy.min(positive), numpy.max(positive)*(1.0 + 1e-12), num_bins + 1)
+    else:
+        raise ValueError("scale must be 'linear' or 'log'")
+
+def get_bin_ids(keys, bin_edges, values):
+    # bin of every (key, value) pair, and which pairs fall inside the bins
+    ids = numpy.searchsorted(bin_edges, keys, side="right") - 1
+    keep = (ids >= 0) & (ids < len(bin_edges) - 1) & ~numpy.isnan(values)
+    return (ids, keep)
+
+def get_bin_centers(bin_edges, scale):
+    if scale == "log":
+        return numpy.sqrt(bin_edges[:-1]*bin_edges[1:])
+    return (bin_edges[:-1] + bin_edges[1:])/2.0
+
+def binned_statistics(keys, values, bin_edges, quantiles=(0.5,), scale="linear"):
+    # per-bin counts, means and (linearly interpolated, as numpy.quantile)
+    # quantiles of `values`; `quantiles[q][j]` is quantile `q` of bin `j`
+    keys = numpy.asarray(keys)
+    values = numpy.asarray(values, dtype=float)
+    bin_edges = numpy.asarray(bin_edges, dtype=float)
+    num_bins = len(bin_edges) - 1
+    (ids, keep) = get_bin_ids(keys, bin_edges, values)
+    (ids, values) = (ids[keep], values[keep])
+    counts = numpy.bincount(ids, minlength=num_bins)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        means = numpy.bincount(ids, weights=values, minlength=num_bins)/counts
+
+    # sort by (bin, value), so each bin's values form a sorted run
+    sorted_values = values[numpy.lexsort((values, ids))]
+    starts = numpy.cumsum(counts) - counts
+    bin_quantiles = numpy.full((len(quantiles), num_bins), numpy.nan)
+    nonempty = counts > 0
+    for (q, quantile) in enumerate(quantiles):
+        position = starts[nonempty] + quantile*(counts[nonempty] - 1)
+        below = numpy.floor(position).astype(numpy.int64)
+        above = numpy.ceil(position).astype(numpy.int64)
+        bin_quantiles[q, nonempty] = sorted_values[below] + \
+            (position - below)*(sorted_values[above] - sorted_values[below])
+    return BinnedStatistics(bin_edges, get_bin_centers(bin_edges, scale), counts, means, bin_quantiles)
+
+class BinnedAccumulator:
+    # Streaming version of `binned_statistics` for (key, value) pairs that
+    # arrive in chunks, e.g. from graphs that do not fit in memory. It keeps
+    # per-bin counts and sums, so the means are exact, and a histogram of the
+    # values over `value_edges` in each bin; the values must lie within
+    # [value_edges[0], value_edges[-1]]. The quantiles are interpolated in
+    # the histogram's CDF, as if the values in each value bin were spread
+    # evenly over it. In bins with many values this is close to
+    # numpy.quantile, but in bins with few values numpy.quantile interpolates
+    # between neighboring values, and the two can differ by up to the gap
+    # between them, far more than one value bin.
+
+    def __init__(self, bin_edges, value_edges, scale="linear"):
+        self.bin_edges = numpy.asarray(bin_edges, dtype=float)
+        self.value_edges = numpy.asarray(value_edges, dtype=float)
+        self.scale = scale
+        num_bins = len(self.bin_edges) - 1
+        self.counts = numpy.zeros(num_bins, dtype=numpy.int64)
+        self.sums = numpy.zeros(num_bins)
+        self.value_counts = numpy.zeros((num_bins, len(self.value_edges) - 1), dtype=numpy.int64)
+
+    def add(self, keys, values):
+        values = numpy.asarray(values, dtype=float)
+        (ids, keep) = get_bin_ids(numpy.asarray(keys), self.bin_edges, values)
+        (ids, values) = (ids[keep], values[keep])
+        if numpy.any(values < self.value_edges[0]) or numpy.any(values > self.value_edges[-1]):
+            raise ValueError("values must lie within [value_edges[0], value_edges[-1]]")
+        num_bins = len(self.counts)
+        num_value_bins = self.value_counts.shape[1]
+        self.counts += numpy.bincount(ids, minlength=num_bins)
+        self.sums += numpy.bincount(ids, weights=values, minlength=num_bins)
+        value_ids = numpy.clip(numpy.searchsorted(self.value_edges, values, side="right") - 1,
+                               0, num_value_bins - 1)
+        self.value_counts += numpy.bincount(ids*num_value_bins + value_ids,
+                                            minlength=num_bins*num_value_bins).reshape(num_bins, num_value_bins)
+
+    def result(self, quantiles=(0.5,)):
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            means = self.sums/self.counts
+        cumulative = numpy.cumsum(self.value_counts, axis=1)
+        bin_quantiles = numpy.full((len(quantiles), len(self.counts)), numpy.nan)
+        for j in numpy.nonzero(self.counts)[0]:
+            bin_quantiles[:, j] = numpy.interp(numpy.asarray(quantiles)*self.counts[j],
+                                               numpy.concatenate([[0], cumulative[j]]), self.value_edges)
+        return BinnedStatistics(self.bin_edges, get_bin_centers(self.bin_edges, self.scale),
+                                self.counts.copy(), means, bin_quantiles)
+
 civals_igraph = numpy.array(ppi_igraph.transitivity_local_undirected())
 deg_igraph = ppi_igraph.degree()
 deg_npa = numpy.array(deg_igraph)
-deg_binids = numpy.rint(deg_npa/50)
 binkvals = 50*numpy.array(range(0,25))
-civals_avg = [numpy.mean(civals_igraph[deg_binids == j]) for j in range(0, 25)]# for each j in 0 to 24, compute mean of vertex Ci vals for all vertices i for which the vertex's degree is in degree bin j
+# bin j holds the degrees with numpy.rint(k/50) == j, as before (rint rounds
+# half to even, so e.g. degree 75 is in bin 2 and degree 125 in bin 2); the
+# mean skips the NaN Ci of degree < 2
+civals_binned = binned_statistics(numpy.rint(deg_npa/50), civals_igraph, numpy.arange(0, 26) - 0.5)
+civals_avg = civals_binned.mean
 
 # on log-log scale, using matplotlib.pyplot, plot civals_avg vs. binkvals
 matplotlib.pyplot.loglog(
@@ -94,6 +488,25 @@ matplotlib.pyplot.ylabel("<Ci>")
 matplotlib.pyplot.xlabel("k")
 matplotlib.pyplot.show()
 
+# the same curve with logarithmic degree bins, and the median and quartiles
+civals_log_binned = binned_statistics(deg_npa, civals_igraph, get_bin_edges(deg_npa, 20, "log"),
+                                      quantiles=(0.25, 0.5, 0.75), scale="log")
+matplotlib.pyplot.loglog(civals_log_binned.centers, civals_log_binned.mean, label="mean")
+matplotlib.pyplot.loglog(civals_log_binned.centers, civals_log_binned.quantiles[1], label="median")
+matplotlib.pyplot.fill_between(civals_log_binned.centers, civals_log_binned.quantiles[0],
+                               civals_log_binned.quantiles[2], alpha=0.3)
+matplotlib.pyplot.ylabel("<Ci>")
+matplotlib.pyplot.xlabel("k")
+matplotlib.pyplot.legend()
+matplotlib.pyplot.show()
+
+# the same statistics, streamed over chunks of vertices (C_i lies in [0, 1])
+civals_accumulator = BinnedAccumulator(get_bin_edges(deg_npa, 20, "log"), numpy.linspace(0.0, 1.0, 1001),
+                                       scale="log")
+for chunk in numpy.array_split(numpy.arange(len(deg_npa)), 10):
+    civals_accumulator.add(deg_npa[chunk], civals_igraph[chunk])
+print(numpy.nanmax(numpy.abs(civals_accumulator.result().mean - civals_log_binned.mean)))
+
 civals = numpy.zeros(len(ppi_adj_list))
 civals[:] = numpy.NaN
 
@@ -124,4 +537,6 @@ print("%0.2f" % ci_elapsed)
 
 pympler.asizeof.asizeof(ppi_adj_hash)/1000000
 
-pympler.asizeof.asizeof(ppi_adj_forest)/1000000
\ No newline at end of file
+pympler.asizeof.asizeof(ppi_adj_forest)/1000000
+
+pympler.asizeof.asizeof(ppi_adj_index)/1000000
\ No newline at end of file
@@ -6,7 +6,7 @@ import numpy as np
 import collections
 import pprint
 import operator
-from typing import List, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 !curl https://csx46.s3-us-west-2.amazonaws.com/PathwayCommons9.All.hgnc.sif.gz --output PathwayCommons9.All.hgnc.sif.gz
 !gunzip -f PathwayCommons9.All.hgnc.sif.gz
@@ -58,6 +58,241 @@ three_component_inds = [vertex_index for vertex_index, component_id in
                         enumerate(component_ids) if component_id == 3]
 ppi_igraph.vs(three_component_inds)["name"]
 
+# Connected components without building a Graph: an array-backed union-find
+# (disjoint-set forest) over integer vertex IDs, with path halving and union
+# by size. Edges are added a chunk at a time; the roots of all their
+# endpoints are found together by vectorized pointer jumping (which also
+# halves the paths it walks), the edges whose endpoints already share a root
+# are dropped, and only the remaining, merging ones go through the scalar
+# `union`. Memory is O(N) in the number of vertices, whatever the number of
+# edges.
+class UnionFind:
+    def __init__(self, n: int = 0):
+        self.n = 0
+        self.parent = np.zeros(0, dtype=np.int64)
+        self.size = np.zeros(0, dtype=np.int64)
+        self.add_vertices(n)
+
+    def add_vertices(self, n: int) -> None:
+        # grow to `n` vertices, each new one in a set of its own (the arrays
+        # double in capacity, so growing one vertex at a time is cheap)
+        if n <= self.n:
+            return
+        if n > len(self.parent):
+            capacity = max(n, 2*len(self.parent))
+            parent = np.arange(capacity, dtype=np.int64)
+            parent[0:self.n] = self.parent[0:self.n]
+            size = np.ones(capacity, dtype=np.int64)
+            size[0:self.n] = self.size[0:self.n]
+            (self.parent, self.size) = (parent, size)
+        self.n = n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return int(x)
+
+    def find_many(self, xs: np.ndarray) -> np.ndarray:
+        parent = self.parent
+        roots = np.asarray(xs, dtype=np.int64)
+        while True:
+            parents = parent[roots]
+            if np.array_equal(parents, roots):
+                return roots
+            grandparents = parent[parents]
+            parent[roots] = grandparents
+            roots = grandparents
+
+    def union(self, a: int, b: int) -> Optional[Tuple[int, int, int, int]]:
+        # merge the sets of `a` and `b`; returns (root of the merged set,
+        # root that was absorbed into it, and their sizes before the merge), or
+        # None if they were already joined
+        ra = self.find(a)
+        rb = self.find(b)
+        if ra == rb:
+            return None
+        if self.size[ra] < self.size[rb]:
+            (ra, rb) = (rb, ra)
+        sizes = (int(self.size[ra]), int(self.size[rb]))
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return (ra, rb) + sizes
+
+    def union_edges(self, src: np.ndarray, dst: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        # adds a chunk of edges; returns the merges, as from `union`
+        ra = self.find_many(src)
+        rb = self.find_many(dst)
+        merging = ra != rb
+        pairs = np.unique(np.stack([np.minimum(ra[merging], rb[merging]),
+                                    np.maximum(ra[merging], rb[merging])], axis=1), axis=0)
+        merges = []
+        for (a, b) in pairs.tolist():
+            merge = self.union(a, b)
+            if merge is not None:
+                merges.append(merge)
+        return merges
+
+    def roots(self) -> np.ndarray:
+        return self.find_many(np.arange(self.n))
+
+    def membership(self) -> np.ndarray:
+        # component ID of every vertex, numbered like `Graph.clusters()`: in
+        # order of each component's lowest vertex ID
+        (_, first_vertices, ids) = np.unique(self.roots(), return_index=True, return_inverse=True)
+        order = np.empty(len(first_vertices), dtype=np.int64)
+        order[np.argsort(first_vertices)] = np.arange(len(first_vertices))
+        return order[ids]
+
+    def sizes(self) -> np.ndarray:
+        return np.bincount(self.membership())
+
+    def giant_component(self) -> np.ndarray:
+        membership = self.membership()
+        return np.nonzero(membership == np.argmax(np.bincount(membership)))[0]
+
+def get_vertex_ids(names: np.ndarray, vocabulary: Dict[str, int]) -> np.ndarray:
+    # integer IDs of `names`, adding the names not seen before to `vocabulary`
+    # in order of first appearance
+    (unique_names, first_positions, inverse) = np.unique(names, return_index=True, return_inverse=True)
+    unique_ids = np.array([vocabulary.get(name, -1) for name in unique_names.tolist()], dtype=np.int64)
+    new = np.nonzero(unique_ids < 0)[0]
+    new = new[np.argsort(first_positions[new])]
+    unique_ids[new] = np.arange(len(vocabulary), len(vocabulary) + len(new))
+    vocabulary.update(zip(unique_names[new].tolist(), unique_ids[new].tolist()))
+    return unique_ids[inverse]
+
+def stream_sif_components(sif_path: str, interaction_types: Optional[Iterable[str]] = None,
+                          chunksize: int = 1000000) -> Tuple[UnionFind, List[str]]:
+    # reads the SIF file `chunksize` lines at a time, keeping only the
+    # interactions of the given types (all, if None); vertices get IDs in the
+    # order they first appear, row by row, as with `Graph.TupleList`. Returns
+    # the union-find and the vertex names in ID order.
+    if interaction_types is not None:
+        interaction_types = set(interaction_types)
+    vocabulary = dict()
+    components = UnionFind()
+    for chunk in pd.read_csv(sif_path, sep="\t", names=["species1", "interaction_type", "species2"],
+                             chunksize=chunksize):
+        if interaction_types is not None:
+            chunk = chunk[chunk.interaction_type.isin(interaction_types)]
+        ids = get_vertex_ids(chunk[["species1", "species2"]].to_numpy().ravel(), vocabulary)
+        components.add_vertices(len(vocabulary))
+        components.union_edges(ids[0::2], ids[1::2])
+    return (components, list(vocabulary))
+
+(sif_components, sif_vertex_names) = stream_sif_components("PathwayCommons9.All.hgnc.sif",
+                                                           interaction_types_ppi)
+print(sorted(sif_components.sizes().tolist()) == sorted(ppi_component_sizes))
+print(len(sif_components.giant_component()) == max(ppi_component_sizes))
+
+# same partition as `clusters()`, up to relabeling
+ppi_vertex_ids = {name: i for i, name in enumerate(ppi_igraph.vs["name"])}
+sif_membership = sif_components.membership()
+print(len(set(zip(sif_membership.tolist(),
+                  [component_ids[ppi_vertex_ids[name]] for name in sif_vertex_names]))) ==
+      len(ppi_component_sizes))
+
+# Tracking components while edges are added batch by batch, on top of the
+# union-find: every merge updates a histogram of component sizes (size ->
+# number of components) and the pointer to the giant component, and is
+# reported as a `ComponentMerge` event, so nothing is recomputed per batch.
+# Union-find cannot split sets, so removed edges are only queued; once
+# `rebuild_after` removals are pending, the components are rebuilt from the
+# remaining edges (the tracker keeps every added edge for that).
+ComponentMerge = collections.namedtuple("ComponentMerge",
+                                        ["root", "absorbed_root", "root_size", "absorbed_size"])
+
+class ComponentTracker:
+    def __init__(self, n: int = 0, rebuild_after: int = 1):
+        self.rebuild_after = rebuild_after
+        self.edges = []
+        self.removed_edges = []
+        self.reset(n)
+
+    def reset(self, n: int) -> None:
+        self.components = UnionFind(n)
+        self.size_histogram = collections.Counter({1: n} if n > 0 else {})
+        self.giant_root = 0 if n > 0 else -1
+        self.giant_size = 1 if n > 0 else 0
+
+    def add_vertices(self, n: int) -> None:
+        if n > self.components.n:
+            self.size_histogram[1] += n - self.components.n
+            if self.giant_root < 0:
+                (self.giant_root, self.giant_size) = (self.components.n, 1)
+            self.components.add_vertices(n)
+
+    def add_edges(self, src: np.ndarray, dst: np.ndarray) -> List[ComponentMerge]:
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if len(src) == 0:
+            return []
+        self.edges.append(np.stack([src, dst], axis=1))
+        self.add_vertices(int(max(np.max(src), np.max(dst))) + 1)
+        return self.apply_merges(self.components.union_edges(src, dst))
+
+    def apply_merges(self, merges: List[Tuple[int, int, int, int]]) -> List[ComponentMerge]:
+        events = []
+        for (root, absorbed_root, root_size, absorbed_size) in merges:
+            self.size_histogram[root_size] -= 1
+            self.size_histogram[absorbed_size] -= 1
+            self.size_histogram[root_size + absorbed_size] += 1
+            for old_size in (root_size, absorbed_size):
+                if self.size_histogram[old_size] == 0:
+                    del self.size_histogram[old_size]
+            if root_size + absorbed_size >= self.giant_size:
+                (self.giant_root, self.giant_size) = (root, root_size + absorbed_size)
+            events.append(ComponentMerge(root, absorbed_root, root_size, absorbed_size))
+        return events
+
+    def remove_edges(self, src: np.ndarray, dst: np.ndarray) -> None:
+        self.removed_edges.append(np.stack([np.asarray(src, dtype=np.int64),
+                                            np.asarray(dst, dtype=np.int64)], axis=1))
+        if sum(len(edges) for edges in self.removed_edges) >= self.rebuild_after:
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        # drop one stored copy of every removed edge (in either direction)
+        # and union the remaining edges into fresh components
+        edges = np.concatenate(self.edges + [np.zeros((0, 2), dtype=np.int64)])
+        removed = np.concatenate(self.removed_edges + [np.zeros((0, 2), dtype=np.int64)])
+        keys = (np.min(edges, axis=1) << 32) | np.max(edges, axis=1)
+        (removed_keys, removed_counts) = np.unique((np.min(removed, axis=1) << 32) | np.max(removed, axis=1),
+                                                   return_counts=True)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        copy_number = np.arange(len(sorted_keys)) - np.searchsorted(sorted_keys, sorted_keys, side="left")
+        positions = np.minimum(np.searchsorted(removed_keys, sorted_keys), max(len(removed_keys) - 1, 0))
+        num_removed = np.zeros(len(sorted_keys), dtype=np.int64)
+        if len(removed_keys) > 0:
+            matched = removed_keys[positions] == sorted_keys
+            num_removed[matched] = removed_counts[positions[matched]]
+        edges = edges[np.sort(order[copy_number >= num_removed])]
+
+        self.edges = [edges]
+        self.removed_edges = []
+        self.reset(self.components.n)
+        self.apply_merges(self.components.union_edges(edges[:, 0], edges[:, 1]))
+
+    def num_components(self) -> int:
+        return sum(self.size_histogram.values())
+
+    def membership(self) -> np.ndarray:
+        return self.components.membership()
+
+    def giant_component(self) -> np.ndarray:
+        return np.nonzero(self.components.roots() == self.components.find(self.giant_root))[0]
+
+# add the PPI interactions in batches of 20000, following the giant component
+ppi_tracker = ComponentTracker(len(ppi_igraph.vs))
+ppi_edges = np.array(ppi_igraph.get_edgelist())
+for start in range(0, len(ppi_edges), 20000):
+    merges = ppi_tracker.add_edges(ppi_edges[start:start + 20000, 0], ppi_edges[start:start + 20000, 1])
+    print(len(merges), ppi_tracker.num_components(), ppi_tracker.giant_size)
+print(np.array_equal(ppi_tracker.membership(), component_ids))
+
 # define a helper function to make an "edge key"
 # (as a string) from the min(n,m) and max(n,m), separated by a hyphen
 def make_edge_key(n: int, m: int) -> str:
@@ -1,5 +1,10 @@
 import numpy as np
 import timeit
+import collections
+import itertools
+import bisect
+import json
+import os
 
 !apt-get install libcairo2-dev libjpeg-dev libgif-dev
 !pip install pycairo
@@ -26,8 +31,189 @@ def enumerate_edge_list(edge_list, i):
     elems2 = edge_list[inds2, 0].tolist()
     return np.unique(elems1 + elems2).tolist()
 
+# compressed sparse row (CSR) representation: the neighbors of vertex i are
+# neighbors[offsets[i]:offsets[i+1]], sorted; `weights` (if any) is parallel to
+# `neighbors`
+CSRGraph = collections.namedtuple("CSRGraph", ["offsets", "neighbors", "weights"])
+
+def get_csr(edge_list, n=None, weights=None, directed=False):
+    # works straight from `g.get_edgelist()` or an (E, 2) numpy edge array, so
+    # the dense N x N adjacency matrix is never materialized
+    edges = np.asarray(edge_list, dtype=np.int32).reshape(-1, 2)
+    if n is None:
+        n = int(edges.max()) + 1 if len(edges) > 0 else 0
+    src = edges[:, 0]
+    dst = edges[:, 1]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+    if not directed:
+        # an undirected edge is stored once in the row of each of its endpoints
+        src, dst = np.concatenate((src, dst)), np.concatenate((dst, src))
+        if weights is not None:
+            weights = np.concatenate((weights, weights))
+    # sort by source vertex, then by neighbor within each row
+    order = np.lexsort((dst, src))
+    offsets = np.zeros(n + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum(np.bincount(src, minlength=n))
+    return CSRGraph(offsets, dst[order], None if weights is None else weights[order])
+
+def enumerate_csr(g_csr, i):
+    # a zero-copy slice (view) of the neighbor array
+    return g_csr.neighbors[g_csr.offsets[i]:g_csr.offsets[i + 1]]
+
+enumerate_csr(get_csr([[0, 1]]), 0)
+
+# edge list indexed by a source-sorted and a target-sorted permutation of its
+# rows; the out-neighbors of vertex i are
+# targets_by_source[source_offsets[i]:source_offsets[i+1]] and its in-neighbors
+# are sources_by_target[target_offsets[i]:target_offsets[i+1]]; the permutations
+# are kept so that edge attributes (e.g. the SIF interaction type) can be looked up
+IndexedEdgeList = collections.namedtuple("IndexedEdgeList",
+                                         ["edges", "source_order", "source_offsets",
+                                          "targets_by_source", "target_order",
+                                          "target_offsets", "sources_by_target"])
+
+def get_indexed_edge_list(edge_list, n=None):
+    edges = np.asarray(edge_list, dtype=np.int32).reshape(-1, 2)
+    if n is None:
+        n = int(edges.max()) + 1 if len(edges) > 0 else 0
+    vertices = np.arange(n + 1)
+    source_order = np.argsort(edges[:, 0], kind="stable")
+    target_order = np.argsort(edges[:, 1], kind="stable")
+    source_offsets = np.searchsorted(edges[source_order, 0], vertices)
+    target_offsets = np.searchsorted(edges[target_order, 1], vertices)
+    return IndexedEdgeList(edges, source_order, source_offsets, edges[source_order, 1],
+                           target_order, target_offsets, edges[target_order, 0])
+
+def enumerate_indexed_edge_list(g_indexed, i):
+    # same result as enumerate_edge_list (sorted, without duplicates), but only
+    # touches the edges incident on i
+    out_nbrs = g_indexed.targets_by_source[g_indexed.source_offsets[i]:g_indexed.source_offsets[i + 1]]
+    in_nbrs = g_indexed.sources_by_target[g_indexed.target_offsets[i]:g_indexed.target_offsets[i + 1]]
+    return np.unique(np.concatenate((out_nbrs, in_nbrs)))
+
+def iterate_indexed_edge_list(g_indexed):
+    # yields (i, out-neighbors, in-neighbors) for every vertex, as zero-copy slices
+    source_offsets = g_indexed.source_offsets
+    target_offsets = g_indexed.target_offsets
+    for i in range(len(source_offsets) - 1):
+        yield (i,
+               g_indexed.targets_by_source[source_offsets[i]:source_offsets[i + 1]],
+               g_indexed.sources_by_target[target_offsets[i]:target_offsets[i + 1]])
+
+enumerate_indexed_edge_list(get_indexed_edge_list(np.array([[0, 1], [2, 0], [1, 2]])), 0)
+
 igraph.drawing.plot(igraph.Graph.Barabasi(5,3), bbox=[0,0,200,200])
 
+# on-disk graph snapshot: a directory holding a small `header.json` and one .npy
+# file per array (CSR offsets and neighbors, the CSR slot -> edge row map, the
+# (E, 2) edge array, the vertex names and one file per edge attribute), so that
+# loading is just np.load(..., mmap_mode="r") with no parsing, and the pages are
+# shared between processes through the OS page cache
+GraphSnapshot = collections.namedtuple("GraphSnapshot",
+                                       ["csr", "edge_ids", "edges", "names", "directed",
+                                        "edge_attributes", "edge_categories"])
+
+SNAPSHOT_FORMAT = "graph-snapshot"
+SNAPSHOT_VERSION = 1
+
+def save_graph_snapshot(path, edge_list, names, directed=False, edge_attributes=None):
+    # `edge_attributes` maps attribute name -> one value per edge; string-valued
+    # attributes (e.g. `interaction_type`) are stored as int32 codes, with the
+    # category table kept in the header
+    edges = np.asarray(edge_list, dtype=np.int32).reshape(-1, 2)
+    names = np.asarray(names, dtype=str)
+    n = len(names)
+    m = len(edges)
+    os.makedirs(path, exist_ok=True)
+    g_csr = get_csr(edges, n=n, directed=directed)
+    src = edges[:, 0]
+    dst = edges[:, 1]
+    edge_ids = np.arange(m, dtype=np.int32)
+    if not directed:
+        src, dst = np.concatenate((src, dst)), np.concatenate((dst, src))
+        edge_ids = np.concatenate((edge_ids, edge_ids))
+    # same ordering as get_csr, so edge_ids[k] is the edge row of CSR slot k
+    edge_ids = edge_ids[np.lexsort((dst, src))]
+    arrays = {"offsets": g_csr.offsets, "neighbors": g_csr.neighbors,
+              "edge_ids": edge_ids, "edges": edges, "names": names}
+    categories = {}
+    for attr_name, values in (edge_attributes or {}).items():
+        values = np.asarray(values)
+        if len(values) != m:
+            raise ValueError("edge attribute %s has %d values for %d edges" % (attr_name, len(values), m))
+        if values.dtype.kind in "OSU":
+            attr_categories, values = np.unique(values.astype(str), return_inverse=True)
+            categories[attr_name] = attr_categories.tolist()
+            values = values.astype(np.int32)
+        else:
+            categories[attr_name] = None
+        arrays["edge_attr_" + attr_name] = values
+    # when re-saving over an existing snapshot, its header is removed first and
+    # the new header is written last, so an interrupted save never leaves a
+    # valid header over a mix of old and new arrays; each file is written under
+    # a temporary name and moved into place with os.replace, so readers that
+    # still have the old arrays memory-mapped keep seeing the old files
+    header_path = os.path.join(path, "header.json")
+    if os.path.exists(header_path):
+        os.remove(header_path)
+    for array_name, array in arrays.items():
+        array_path = os.path.join(path, array_name + ".npy")
+        with open(array_path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(array_path + ".tmp", array_path)
+    header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "n": n, "m": m,
+              "directed": directed, "edge_attributes": categories}
+    with open(header_path + ".tmp", "w") as f:
+        json.dump(header, f)
+    os.replace(header_path + ".tmp", header_path)
+
+def save_sif_snapshot(path, species1, interaction_type, species2, directed=False):
+    # e.g. save_sif_snapshot("pc9_snapshot", sif_data.species1.values,
+    #                        sif_data.interaction_type.values, sif_data.species2.values)
+    names, ids = np.unique(np.concatenate((np.asarray(species1, dtype=str),
+                                           np.asarray(species2, dtype=str))),
+                           return_inverse=True)
+    edges = ids.reshape(2, -1).T
+    save_graph_snapshot(path, edges, names, directed=directed,
+                        edge_attributes={"interaction_type": interaction_type})
+
+def load_graph_snapshot(path):
+    with open(os.path.join(path, "header.json")) as f:
+        header = json.load(f)
+    if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("%s is not a version %d graph snapshot" % (path, SNAPSHOT_VERSION))
+    def load_array(array_name):
+        return np.load(os.path.join(path, array_name + ".npy"), mmap_mode="r")
+    edge_attributes = {attr_name: load_array("edge_attr_" + attr_name)
+                       for attr_name in header["edge_attributes"]}
+    return GraphSnapshot(CSRGraph(load_array("offsets"), load_array("neighbors"), None),
+                         load_array("edge_ids"), load_array("edges"), load_array("names"),
+                         header["directed"], edge_attributes, header["edge_attributes"])
+
+def get_snapshot_edge_attribute(snapshot, attr_name):
+    # decodes a string-valued attribute back from its codes
+    values = snapshot.edge_attributes[attr_name]
+    attr_categories = snapshot.edge_categories[attr_name]
+    if attr_categories is None:
+        return np.asarray(values)
+    return np.asarray(attr_categories)[values]
+
+def snapshot_to_igraph(snapshot):
+    # for algorithms that are only available in igraph
+    g = igraph.Graph(n=len(snapshot.names), edges=np.asarray(snapshot.edges).tolist(),
+                     directed=snapshot.directed)
+    g.vs["name"] = snapshot.names.tolist()
+    for attr_name in snapshot.edge_attributes:
+        g.es[attr_name] = get_snapshot_edge_attribute(snapshot, attr_name).tolist()
+    return g
+
+g_snap = igraph.Graph.Barabasi(1000, 3)
+save_graph_snapshot("barabasi_snapshot", g_snap.get_edgelist(),
+                    ["v%d" % i for i in range(g_snap.vcount())],
+                    edge_attributes={"interaction_type": ["interacts-with"]*g_snap.ecount()})
+snapshot_to_igraph(load_graph_snapshot("barabasi_snapshot")).summary()
+
 def do_sim_ms(n):
 
     retlist = []
@@ -40,10 +226,12 @@ def do_sim_ms(n):
         # make a random undirected graph with fixed (average) vertex degree = 5
         g = igraph.Graph.Barabasi(n, 5)
 
-        # get the graph in three different representations
+        # get the graph in five different representations
         g_matrix = np.matrix(g.get_adjacency().data)
         g_adj_list = g.get_adjlist()
         g_edge_list = np.array(g.get_edgelist())
+        g_csr = get_csr(g.get_edgelist(), n=n)
+        g_indexed = get_indexed_edge_list(g_edge_list, n=n)
 
         start_time = timeit.default_timer()
 
@@ -69,15 +257,34 @@ def do_sim_ms(n):
 
         edgelist_elapsed = timeit.default_timer() - start_time
 
-        retlist.append([matrix_elapsed, adjlist_elapsed, edgelist_elapsed])
+        start_time = timeit.default_timer()
+
+        for _ in range(nsubrep):
+             for i in range(0, n):
+                enumerate_csr(g_csr, i)
+
+        csr_elapsed = timeit.default_timer() - start_time
+
+        start_time = timeit.default_timer()
+
+        for _ in range(nsubrep):
+             for i in range(0, n):
+                enumerate_indexed_edge_list(g_indexed, i)
+
+        indexed_elapsed = timeit.default_timer() - start_time
+
+        retlist.append([matrix_elapsed, adjlist_elapsed, edgelist_elapsed, csr_elapsed,
+                        indexed_elapsed])
 
-        resarray = 1000.0 * np.mean(np.array(retlist), axis=0)/n
+    # average over replicates and then
+    # divide by n so that the running time results are on a per-vertex basis
+    resarray = 1000.0 * np.mean(np.array(retlist), axis=0)/n
 
-        resdict = {'adjacency matrix': resarray[0],
-                   'adjacency list': resarray[1],
-                   'edge list': resarray[2]}
-        # average over replicates and then
-        # divide by n so that the running time results are on a per-vertex basis
+    resdict = {'adjacency matrix': resarray[0],
+               'adjacency list': resarray[1],
+               'edge list': resarray[2],
+               'CSR': resarray[3],
+               'indexed edge list': resarray[4]}
     return resdict
 
 do_sim_ms(1000)
@@ -110,6 +317,111 @@ def get_bst_forest(theadjlist):
         theforest.append(itree)
     return theforest
 
+# membership index replacing the BST forest: every vertex's sorted neighbors are
+# an int32 run inside one contiguous buffer (neighbors[offsets[i]:offsets[i+1]]),
+# and hubs whose degree is at least n/32 (so that an n-bit bitmap is no bigger
+# than their run of 32-bit neighbor IDs) also get a row of packed bits in
+# `hub_bits`; `hub_rows[i]` is that row, or -1 for a non-hub. `views` holds
+# memoryviews of those four arrays for the scalar lookups: indexing a
+# memoryview gives a plain int, where indexing the array creates a numpy
+# scalar, which made every bisect comparison as slow as an AVL tree step
+SortedNeighborIndex = collections.namedtuple("SortedNeighborIndex",
+                                             ["offsets", "neighbors", "hub_rows", "hub_bits", "views"])
+
+def get_sorted_index(theadjlist):
+    n = len(theadjlist)
+    degrees = np.array([len(a) for a in theadjlist], dtype=np.int64)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(degrees)
+    neighbors = np.fromiter(itertools.chain.from_iterable(sorted(a) for a in theadjlist),
+                            dtype=np.int32, count=offsets[n])
+    hubs = np.nonzero(32*degrees >= n)[0]
+    hub_rows = np.full(n, -1, dtype=np.int32)
+    hub_rows[hubs] = np.arange(len(hubs))
+    hub_bits = np.zeros((len(hubs), (n + 7)//8), dtype=np.uint8)
+    hub_degrees = degrees[hubs]
+    slots = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in hubs] +
+                           [np.zeros(0, dtype=np.int64)])
+    rows = np.repeat(np.arange(len(hubs)), hub_degrees)
+    hub_nbrs = neighbors[slots]
+    np.bitwise_or.at(hub_bits, (rows, hub_nbrs >> 3), (1 << (hub_nbrs & 7)).astype(np.uint8))
+    views = tuple(memoryview(a) for a in (offsets, neighbors, hub_rows, hub_bits))
+    return SortedNeighborIndex(offsets, neighbors, hub_rows, hub_bits, views)
+
+def find_sorted_index(sorted_index, i, j):
+    # drop-in replacement for find_bst_forest: a bit test for hubs, otherwise a
+    # binary search of vertex i's neighbor run
+    (offsets, neighbors, hub_rows, hub_bits) = sorted_index.views
+    row = hub_rows[i]
+    if row >= 0:
+        return bool((hub_bits[row, j >> 3] >> (j & 7)) & 1)
+    lo = offsets[i]
+    hi = offsets[i + 1]
+    k = bisect.bisect_left(neighbors, j, lo, hi)
+    return k < hi and neighbors[k] == j
+
+# batched versions of the find_* functions: `pairs` is a (K, 2) integer array of
+# (i, j) queries, and the result is a length-K boolean array
+
+def find_many_matrix(gmat, pairs):
+    return np.asarray(gmat)[pairs[:, 0], pairs[:, 1]] == 1
+
+def find_many_sorted_keys(keys, queries):
+    # membership of each query in a sorted int64 key array, via one searchsorted
+    if len(keys) == 0:
+        return np.zeros(len(queries), dtype=bool)
+    inds = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+    return keys[inds] == queries
+
+def find_many_csr(g_csr, pairs):
+    # encode slot (i, j) as the key i*n + j; the CSR rows are in vertex order and
+    # the neighbors within each row are sorted, so the keys are already sorted
+    n = len(g_csr.offsets) - 1
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(g_csr.offsets))
+    keys = rows*n + g_csr.neighbors
+    return find_many_sorted_keys(keys, pairs[:, 0].astype(np.int64)*n + pairs[:, 1])
+
+def find_many_edge_list(edge_list, pairs):
+    # like find_edge_list, an edge matches in either orientation
+    n = int(max(edge_list.max(initial=-1), pairs.max(initial=-1))) + 1
+    src = edge_list[:, 0].astype(np.int64)
+    dst = edge_list[:, 1].astype(np.int64)
+    keys = np.sort(np.concatenate((src*n + dst, dst*n + src)))
+    return find_many_sorted_keys(keys, pairs[:, 0].astype(np.int64)*n + pairs[:, 1])
+
+def get_csr_from_adj_list(adj_list):
+    # works for an adjacency list, a list of neighbor sets (the "hash" representation)
+    # or a BST forest, since all of them can be iterated per vertex
+    n = len(adj_list)
+    rows = np.repeat(np.arange(n, dtype=np.int32), [len(a) for a in adj_list])
+    nbrs = np.fromiter(itertools.chain.from_iterable(adj_list), dtype=np.int32,
+                       count=len(rows))
+    return get_csr(np.column_stack((rows, nbrs)), n=n, directed=True)
+
+def find_many(rep, pairs):
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    if isinstance(rep, CSRGraph):
+        return find_many_csr(rep, pairs)
+    if isinstance(rep, SortedNeighborIndex):
+        return find_many_csr(CSRGraph(rep.offsets, rep.neighbors, None), pairs)
+    if isinstance(rep, IndexedEdgeList):
+        return find_many_edge_list(rep.edges, pairs)
+    if isinstance(rep, np.matrix):
+        return find_many_matrix(rep, pairs)
+    if isinstance(rep, np.ndarray):
+        # a plain array is either an E x 2 integer edge list or an N x N
+        # adjacency matrix; a 2 x 2 array of zeros and ones could be both
+        if rep.ndim == 2 and rep.shape[1] == 2 and np.issubdtype(rep.dtype, np.integer) and \
+                (rep.shape[0] != 2 or np.any((rep != 0) & (rep != 1))):
+            return find_many_edge_list(rep, pairs)
+        if rep.ndim == 2 and rep.shape[0] == rep.shape[1] and rep.shape[0] != 2:
+            return find_many_matrix(rep, pairs)
+        raise ValueError("cannot tell whether an array of shape %s is an edge list or an adjacency "
+                         "matrix; pass an np.matrix or an IndexedEdgeList" % (rep.shape,))
+    # list-based representations are converted to CSR first; when issuing many
+    # batches against the same graph, convert once with get_csr_from_adj_list
+    return find_many_csr(get_csr_from_adj_list(rep), pairs)
+
 def do_sim(n, k):
 
     retlist = []
@@ -122,13 +434,17 @@ def do_sim(n, k):
         # make the random undirected graph
         g = igraph.Graph.Barabasi(n, k)
 
-        # get the graph in three different representations
+        # get the graph in four different representations
         g_matrix = np.matrix(g.get_adjacency().data)
 
         g_adj_list = g.get_adjlist()
 
         g_bst_forest = get_bst_forest(g_adj_list)
 
+        g_sorted_index = get_sorted_index(g_adj_list)
+
+        g_csr = get_csr(g.get_edgelist(), n=n)
+
         start_time = timeit.default_timer()
 
         # inner loop only needs to go from i+1 to n, since the graph is undirected
@@ -159,10 +475,56 @@ def do_sim(n, k):
 
         forest_elapsed = timeit.default_timer() - start_time
 
-        retlist.append([matrix_elapsed, adjlist_elapsed, forest_elapsed])
+        start_time = timeit.default_timer()
+
+        # inner loop only needs to go from i+1 to n, since the graph is undirected
+        for _ in range(nsubrep):
+            for i in range(0, n):
+                for j in range(i+1, n):
+                    find_sorted_index(g_sorted_index, i, j)
+
+        sorted_index_elapsed = timeit.default_timer() - start_time
+
+        # the same (i, j) pairs, i < j, as a single (K, 2) array for the batched path
+        pairs = np.column_stack(np.triu_indices(n, 1))
+
+        start_time = timeit.default_timer()
+
+        for _ in range(nsubrep):
+            find_many(g_matrix, pairs)
+
+        matrix_batched_elapsed = timeit.default_timer() - start_time
+
+        start_time = timeit.default_timer()
+
+        # includes the conversion of the adjacency list to CSR
+        for _ in range(nsubrep):
+            find_many(g_adj_list, pairs)
+
+        adjlist_batched_elapsed = timeit.default_timer() - start_time
+
+        start_time = timeit.default_timer()
+
+        for _ in range(nsubrep):
+            find_many(g_csr, pairs)
 
-        # get the results in seconds, and make sure to divide by number of vertex pairs
-    return 1000000*np.mean(np.array(retlist), axis=0)/(n*(n-1)/2)
+        csr_batched_elapsed = timeit.default_timer() - start_time
+
+        retlist.append([matrix_elapsed, adjlist_elapsed, forest_elapsed,
+                        sorted_index_elapsed, matrix_batched_elapsed, adjlist_batched_elapsed,
+                        csr_batched_elapsed])
+
+    # get the results in microseconds, and make sure to divide by number of vertex pairs
+    resarray = 1000000*np.mean(np.array(retlist), axis=0)/(n*(n-1)/2)
+
+    resdict = {'adjacency matrix': resarray[0],
+               'adjacency list': resarray[1],
+               'BST forest': resarray[2],
+               'sorted index': resarray[3],
+               'adjacency matrix (batched)': resarray[4],
+               'adjacency list (batched)': resarray[5],
+               'CSR (batched)': resarray[6]}
+    return resdict
 
 do_sim(1000, 5)
 
@@ -172,4 +534,161 @@ do_sim(1000, 20)
 
 do_sim(1000, 50)
 
-do_sim(1000, 100)
\ No newline at end of file
+do_sim(1000, 100)
+
+!pip install pympler
+import csv, datetime, multiprocessing, platform, resource, sys, tracemalloc
+import pympler.asizeof
+
+# every representation benchmarked by run_representation_benchmarks, as
+# (build function, enumerate function, scalar find function); None marks an
+# operation that the representation does not have (find_edge_list compares
+# elements rather than rows, so it is not used as a membership test here)
+BENCHMARK_REPRESENTATIONS = {
+    # np.matrix of a nested list is a view of a temporary array, which
+    # pympler.asizeof cannot size, so the matrix is built from an owned array
+    'adjacency matrix': (lambda g: np.matrix(np.array(g.get_adjacency().data)),
+                         enumerate_matrix, find_matrix),
+    'adjacency list': (lambda g: g.get_adjlist(), enumerate_adj_list, find_adj_list),
+    'adjacency hash': (lambda g: [set(a) for a in g.get_adjlist()], enumerate_adj_list, find_adj_list),
+    'edge list': (lambda g: np.array(g.get_edgelist()), enumerate_edge_list, None),
+    'BST forest': (lambda g: get_bst_forest(g.get_adjlist()), None, find_bst_forest),
+    'CSR': (lambda g: get_csr(g.get_edgelist(), n=g.vcount()), enumerate_csr, None),
+    'indexed edge list': (lambda g: get_indexed_edge_list(g.get_edgelist(), n=g.vcount()),
+                          enumerate_indexed_edge_list, None),
+    'sorted index': (lambda g: get_sorted_index(g.get_adjlist()), None, find_sorted_index),
+}
+
+BENCHMARK_TIME_METRICS = ['build_s', 'enumerate_us_per_vertex', 'find_us_per_pair',
+                          'find_many_us_per_pair']
+
+def get_machine_metadata():
+    return {'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'igraph': igraph.__version__,
+            'timestamp': datetime.datetime.now().isoformat()}
+
+def time_per_op(func, nops, nsubrep):
+    # microseconds per operation, taking the best of `nsubrep` runs
+    elapsed = []
+    for _ in range(nsubrep):
+        start_time = timeit.default_timer()
+        func()
+        elapsed.append(timeit.default_timer() - start_time)
+    return 1000000*min(elapsed)/nops
+
+def build_in_child(build, g, conn):
+    # ru_maxrss is in kB on Linux (in bytes on macOS)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rep = build(g)
+    conn.send(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before)
+    conn.close()
+
+def measure_build_peak_rss_kb(build, g):
+    # builds the representation in a freshly forked process and returns how
+    # far the build raised that process's peak RSS; the peak RSS of a process
+    # only grows, but a forked child starts from its RSS at the fork rather
+    # than from the parent's high-water mark, so every build gets a clean one
+    ctx = multiprocessing.get_context('fork')
+    (recv_conn, send_conn) = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=build_in_child, args=(build, g, send_conn))
+    process.start()
+    send_conn.close()
+    peak_rss_kb = recv_conn.recv()
+    process.join()
+    return peak_rss_kb
+
+def run_representation_benchmarks(ns=(1000, 2000), ks=(5, 20), nrep=3, nsubrep=3,
+                                  nqueries=10000, max_dense_n=5000, seed=1337):
+    # sweeps graph size N and mean degree k over every representation; each
+    # result is the median over `nrep` random graphs; the dense matrix is
+    # skipped above `max_dense_n` vertices, since it needs O(N^2) memory.
+    # Memory is reported per representation as build_peak_rss_kb (how far the
+    # build raises the peak RSS of a forked process, see
+    # measure_build_peak_rss_kb), build_peak_bytes (the peak of the Python
+    # allocations made while building it, from tracemalloc) and
+    # footprint_bytes (the size of the finished structure)
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in ns:
+        for k in ks:
+            graphs = [igraph.Graph.Barabasi(n, k) for _ in range(nrep)]
+            queries = [rng.integers(0, n, size=(nqueries, 2)) for _ in range(nrep)]
+            for rep_name, (build, enumerate_func, find_func) in BENCHMARK_REPRESENTATIONS.items():
+                if rep_name == 'adjacency matrix' and n > max_dense_n:
+                    continue
+                measurements = collections.defaultdict(list)
+                for g, pairs in zip(graphs, queries):
+                    # the peak allocation comes from a separate, traced build,
+                    # since tracemalloc slows every representation's build by
+                    # a different factor and would skew build_s
+                    tracemalloc.start()
+                    build(g)
+                    measurements['build_peak_bytes'].append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                    measurements['build_peak_rss_kb'].append(measure_build_peak_rss_kb(build, g))
+                    start_time = timeit.default_timer()
+                    rep = build(g)
+                    measurements['build_s'].append(timeit.default_timer() - start_time)
+                    measurements['footprint_bytes'].append(pympler.asizeof.asizeof(rep))
+                    if enumerate_func is not None:
+                        measurements['enumerate_us_per_vertex'].append(time_per_op(
+                            lambda: [enumerate_func(rep, i) for i in range(n)], n, nsubrep))
+                    if find_func is not None:
+                        pair_list = pairs.tolist()
+                        measurements['find_us_per_pair'].append(time_per_op(
+                            lambda: [find_func(rep, i, j) for i, j in pair_list], nqueries, nsubrep))
+                    measurements['find_many_us_per_pair'].append(time_per_op(
+                        lambda: find_many(rep, pairs), nqueries, nsubrep))
+                    del rep
+                result = {'representation': rep_name, 'n': n, 'k': k, 'nrep': nrep}
+                for metric in (BENCHMARK_TIME_METRICS + ['build_peak_rss_kb', 'build_peak_bytes', 'footprint_bytes']):
+                    values = measurements[metric]
+                    result[metric] = float(np.median(values)) if len(values) > 0 else None
+                results.append(result)
+    return results
+
+def save_benchmark_results(results, path_prefix):
+    # writes <path_prefix>.json (results plus machine metadata) and <path_prefix>.csv
+    with open(path_prefix + '.json', 'w') as f:
+        json.dump({'machine': get_machine_metadata(), 'results': results}, f, indent=1)
+    with open(path_prefix + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+def load_benchmark_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+def compare_benchmark_results(results, baseline, threshold=0.25):
+    # flags every timing that is more than `threshold` (as a fraction) slower
+    # than the baseline run for the same representation, N and k
+    baseline_by_key = {(b['representation'], b['n'], b['k']): b for b in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_by_key.get((result['representation'], result['n'], result['k']))
+        if base is None:
+            continue
+        for metric in BENCHMARK_TIME_METRICS:
+            if result[metric] is None or base.get(metric) is None:
+                continue
+            if result[metric] > (1.0 + threshold)*base[metric]:
+                regressions.append({'representation': result['representation'],
+                                    'n': result['n'], 'k': result['k'], 'metric': metric,
+                                    'baseline': base[metric], 'current': result[metric],
+                                    'ratio': result[metric]/base[metric]})
+    return regressions
+
+# a quick smoke run over every representation before the full sweep
+run_representation_benchmarks(ns=(300,), ks=(3,), nrep=1, nsubrep=1, nqueries=100)
+
+benchmark_results = run_representation_benchmarks()
+save_benchmark_results(benchmark_results, 'representation_benchmarks')
+
+# later runs can then be checked against the stored baseline
+compare_benchmark_results(run_representation_benchmarks(),
+                          load_benchmark_results('representation_benchmarks.json'))
\ No newline at end of file
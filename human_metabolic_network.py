@@ -44,7 +44,9 @@ for i, (name, degree) in enumerate(top_six, start=1):
 
 import matplotlib.pyplot as plt
 
-xs, ys = zip(*[(left, count) for left, _, count in g.degree_distribution().bins() if count > 0])
+degree_counts = numpy.bincount(g.degree())
+xs = numpy.nonzero(degree_counts)[0]
+ys = degree_counts[xs]
 
 plt.loglog(xs, ys, linestyle='-', marker=None)
 plt.title('Log-Log Plot of Degree Distribution')